@@ -1,8 +1,16 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_pymongo import PyMongo
 from config import Config
 from flask_cors import CORS
-from utils import JSONEncoder
+from utils import MongoJSONProvider
+from indexes import init_indexes
+from commands import register_commands
+from compression import init_compression
+from storage import UploadRequest
+from sweeper import start_sweeper
+from roundtrips import init_round_trips, round_trips
+from passwords import init_password_hashing
+from auth import init_admin_auth
 import os
 
 from routes.user_signup_routes import create_auth_routes
@@ -15,44 +23,46 @@ from routes.admin_login_routes import setup_admin_routes
 from routes.combo_details_routes import create_combos_details_routes
 from routes.hoodies_details_routes import create_hoodies_details_routes
 from routes.tshirt_detail_routes  import create_tshirts_details_routes
+from routes.stats_routes import create_stats_routes
+from routes.catalog_routes import create_catalog_routes
+from routes.media_routes import create_media_routes
+from routes.upload_routes import create_upload_routes
+from routes.import_routes import create_import_routes
+from routes.export_routes import create_export_routes
+from routes.bulk_routes import create_bulk_routes
 
 
 app = Flask(__name__)
+# Multipart files are hashed and spooled straight to the media staging area
+app.request_class = UploadRequest
 CORS(app)
 app.config.from_object(Config)
+app.config["USE_X_SENDFILE"] = Config.MEDIA_OFFLOAD == "x-sendfile"
 
-mongo = PyMongo(app)
+# Every MongoDB command is counted (see /api/stats/db and Config.DB_ROUND_TRIP_HEADER)
+mongo = PyMongo(app, event_listeners=[round_trips])
+init_round_trips(app)
 
-# Set custom JSON encoder to handle MongoDB ObjectId
-app.json_encoder = JSONEncoder
-
-os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-
-@app.route('/uploads/hoodies/<filename>')
-def serve_image(filename):
-    return send_from_directory(os.path.join(app.root_path, 'uploads', 'hoodies'), filename)
-
-@app.route('/uploads/combos/<filename>')
-def serve__image(filename):
-    return send_from_directory(os.path.join(app.root_path, 'uploads', 'combos'), filename)
+# Admin token check on write requests (only when Config.ADMIN_AUTH_REQUIRED is set)
+init_admin_auth(app, mongo.db)
 
+# JSON provider that encodes ObjectId, datetime and Decimal128 (orjson-backed when installed)
+app.json = MongoJSONProvider(app)
 
-@app.route('/uploads/tshirts/<filename>')
-def serve__image_(filename):
-    return send_from_directory(os.path.join(app.root_path, 'uploads', 'tshirts'), filename)
+# gzip/brotli for JSON responses, cached per catalog version where possible
+init_compression(app)
 
+# Password hashing runs in a bounded process pool; a saturated pool answers 503
+init_password_hashing(app)
 
-@app.route('/uploads/combos_details/<filename>')
-def serve_the_image_(filename):
-    return send_from_directory(os.path.join(app.root_path, 'uploads', 'combos_details'), filename)
+# Create the indexes the models declare (on the first request) and register the `flask` CLI commands
+init_indexes(app, mongo.db)
+register_commands(app, mongo.db)
 
-@app.route('/uploads/hoodies_details/<filename>')
-def serve_a_image_(filename):
-    return send_from_directory(os.path.join(app.root_path, 'uploads', 'hoodies_details'), filename)
+# Background removal of unreferenced uploads (off unless Config.SWEEP_INTERVAL is set)
+start_sweeper(mongo.db)
 
-@app.route('/uploads/tshirts_details/<filename>')
-def serveimage(filename):
-    return send_from_directory(os.path.join(app.root_path, 'uploads', 'tshirts_details'), filename)
+os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 
 # Register authentication routes (signup)
 auth_bp = create_auth_routes(mongo.db)
@@ -74,6 +84,17 @@ app.register_blueprint(setup_admin_routes(mongo.db))
 app.register_blueprint(create_combos_details_routes(mongo.db), url_prefix='/api')
 app.register_blueprint(create_hoodies_details_routes(mongo.db), url_prefix='/api')
 app.register_blueprint(create_tshirts_details_routes(mongo.db), url_prefix='/api')
+app.register_blueprint(create_stats_routes(), url_prefix='/api')
+app.register_blueprint(create_catalog_routes(mongo.db), url_prefix='/api')
+
+# Resumable uploads; a finished one is attached to a product with the upload_id form field
+app.register_blueprint(create_upload_routes(), url_prefix='/api')
+app.register_blueprint(create_import_routes(mongo.db), url_prefix='/api')
+app.register_blueprint(create_export_routes(mongo.db), url_prefix='/api')
+app.register_blueprint(create_bulk_routes(mongo.db), url_prefix='/api')
+
+# Uploaded images: /uploads/media/... (content-addressed) and the legacy per-category folders
+app.register_blueprint(create_media_routes())
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)  # Ensure the port is specified
@@ -0,0 +1,93 @@
+import time
+import jwt
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import g, jsonify, request
+from config import Config
+from cache import TTLCache
+
+# Tokens that already passed signature and expiry checks, with their claims.
+# Each entry expires with its token, so a cached token is never accepted late.
+token_cache = TTLCache(maxsize=Config.AUTH_TOKEN_CACHE_SIZE, ttl=Config.ADMIN_TOKEN_TTL)
+
+# Admin accounts as the middleware sees them: {"active": bool, "tokens_valid_after": float}
+admin_cache = TTLCache(maxsize=Config.AUTH_ADMIN_CACHE_SIZE, ttl=Config.AUTH_ADMIN_TTL)
+
+# Write endpoints that stay open without a token. Admin signup is not one of
+# them: new admins are created by an admin (or `flask create-admin`).
+PUBLIC_ENDPOINTS = {"auth.signup", "login.user_login", "admin.admin_login"}
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def issue_admin_token(admin_id):
+    now = time.time()
+    payload = {"admin_id": str(admin_id), "iat": now, "exp": int(now + Config.ADMIN_TOKEN_TTL)}
+    return jwt.encode(payload, Config.SECRET_KEY, algorithm="HS256")
+
+
+def bearer_token():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else None
+
+
+def _load_admin(db, admin_id):
+    try:
+        admin = db.admin_login.find_one({"_id": ObjectId(admin_id)}, {"tokens_valid_after": 1})
+    except InvalidId:
+        admin = None
+    if admin is None:
+        return {"active": False, "tokens_valid_after": 0}
+    return {"active": True, "tokens_valid_after": admin.get("tokens_valid_after", 0)}
+
+
+def verify_admin_token(db, token):
+    """Return the claims of a valid, unrevoked admin token, or None.
+
+    A token seen before costs two in-memory lookups: the token cache spares
+    the HMAC and claim checks, and the admin cache the MongoDB read.
+    """
+    if not token:
+        return None
+    key = ("admin_tokens", "item", token)
+    claims = token_cache.get(key)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, Config.SECRET_KEY, algorithms=["HS256"], options={"require": ["exp", "admin_id"]})
+        except jwt.InvalidTokenError:
+            return None
+        token_cache.set(key, claims, ttl=claims["exp"] - time.time())
+
+    admin_id = claims["admin_id"]
+    admin = admin_cache.get_or_load(("admins", "item", admin_id), lambda: _load_admin(db, admin_id))
+    if not admin["active"] or claims.get("iat", 0) < admin["tokens_valid_after"]:
+        return None
+    return claims
+
+
+def revoke_admin_tokens(db, admin_id):
+    """Reject every token issued to `admin_id` until now.
+
+    Takes effect immediately in this process and within AUTH_ADMIN_TTL
+    seconds in the others, when their cached admin lookup expires.
+    """
+    db.admin_login.update_one({"_id": ObjectId(admin_id)}, {"$set": {"tokens_valid_after": time.time()}})
+    admin_cache.invalidate("admins", str(admin_id))
+
+
+def init_admin_auth(app, db):
+    """Require an admin token on every write request outside PUBLIC_ENDPOINTS (if ADMIN_AUTH_REQUIRED)."""
+    if not Config.ADMIN_AUTH_REQUIRED:
+        return
+
+    @app.before_request
+    def require_admin():
+        if request.method in SAFE_METHODS or request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS:
+            return None
+        claims = verify_admin_token(db, bearer_token())
+        if claims is None:
+            response = jsonify({"message": "Admin authentication required"})
+            response.status_code = 401
+            response.headers["WWW-Authenticate"] = "Bearer"
+            return response
+        g.admin_id = claims["admin_id"]
+        return None
@@ -0,0 +1,315 @@
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from bson import ObjectId
+from flask import g, request, make_response
+from config import Config
+from utils import negotiate_encoding, wants_ndjson
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Keys are tuples whose first element is a namespace (the collection name) and
+    whose second element is the kind of entry, e.g. ("tshirts", "item", id) or
+    ("tshirts", "list", params). That lets writers drop exactly the entries a
+    change can affect.
+
+    With `max_bytes`, values must be bytes and the cache is also bounded by
+    their total length; a value longer than that is not cached at all.
+    """
+
+    def __init__(self, maxsize, ttl, max_bytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every invalidate() of a namespace (and by clear()), so a
+        # load that overlapped a write can tell its result may be stale
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Cache `value`; a `ttl` shorter than the cache's own expires it sooner."""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl=None):
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._bytes += self._size(value)
+        while len(self._data) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes):
+            self._drop(next(iter(self._data)))
+            self.evictions += 1
+
+    def _size(self, value):
+        return len(value) if self.max_bytes is not None else 0
+
+    def _drop(self, key):
+        _, value = self._data.pop(key)
+        self._bytes -= self._size(value)
+
+    def _generation(self, namespace):
+        return self._epoch, self._generations.get(namespace, 0)
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for `key`, calling `loader()` to fill a miss.
+
+        A loader result of None (e.g. a missing document) is not cached, and
+        neither is one whose namespace was invalidated while the loader ran:
+        it may have read the data from before the write. A `key` of None
+        bypasses the cache.
+        """
+        if key is None:
+            return loader()
+        value = self.get(key)
+        if value is None:
+            with self._lock:
+                generation = self._generation(key[0])
+            value = loader()
+            if value is not None:
+                with self._lock:
+                    if self._generation(key[0]) == generation:
+                        self._store(key, value)
+        return value
+
+    def invalidate(self, namespace, item_id=None):
+        """Drop everything in `namespace` that a write to `item_id` can change.
+
+        That is the by-id entry for `item_id` plus every list-shaped entry of the
+        namespace; by-id entries of other documents are left alone. With no
+        `item_id` the whole namespace is dropped.
+        """
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            stale = [
+                key for key in self._data
+                if key[0] == namespace and (item_id is None or key[1] != "item" or key[2] == item_id)
+            ]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+            if self.max_bytes is not None:
+                stats.update(bytes=self._bytes, max_bytes=self.max_bytes)
+            return stats
+
+
+
+CachedFile = namedtuple("CachedFile", "data mimetype etag mtime mtime_ns size")
+
+
+class FileCache:
+    """Byte-bounded LRU of small files held in memory together with their validators.
+
+    Entries are keyed by absolute path and checked against the file's mtime and
+    size on every lookup, so a replaced file is re-read instead of served stale.
+    The ETag has the same form send_file computes, so clients revalidate the
+    same way whether or not a file is currently cached.
+    """
+
+    def __init__(self, max_bytes, max_file_size):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    def get_or_load(self, path):
+        """Return the CachedFile for `path`, reading it on a miss; None if it is too large."""
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._data.get(path)
+            if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+                self._data.move_to_end(path)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                self._drop(path)
+                self.stale += 1
+            self.misses += 1
+
+        if stat.st_size > self.max_file_size:
+            return None
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        if len(data) != stat.st_size:
+            return None  # changed while reading
+
+        check = zlib.adler32(path.encode()) & 0xFFFFFFFF
+        entry = CachedFile(
+            data, mimetypes.guess_type(path)[0] or "application/octet-stream",
+            f"{stat.st_mtime}-{stat.st_size}-{check}", stat.st_mtime, stat.st_mtime_ns, stat.st_size,
+        )
+        with self._lock:
+            if path in self._data:
+                self._drop(path)
+            self._data[path] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes and len(self._data) > 1:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+        return entry
+
+    def _drop(self, path):
+        self._bytes -= self._data.pop(path).size
+
+    def invalidate(self, path):
+        with self._lock:
+            if path in self._data:
+                self._drop(path)
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_file_size": self.max_file_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "stale": self.stale,
+                "invalidations": self.invalidations,
+            }
+
+# Process-wide cache for catalog reads. It is per worker process, so another
+# worker's write becomes visible here at the latest after CATALOG_CACHE_TTL.
+catalog_cache = TTLCache(Config.CATALOG_CACHE_SIZE, Config.CATALOG_CACHE_TTL)
+
+# Compressed catalog bodies by ETag and encoding (see compression.py). Kept apart
+# from catalog_cache so that the lookup every compressible request makes, which
+# misses for bodies under COMPRESS_MIN_SIZE, doesn't skew the catalog hit ratio,
+# and bounded by bytes since a body can be a whole collection.
+encoded_cache = TTLCache(Config.ENCODED_CACHE_SIZE, Config.CATALOG_CACHE_TTL, max_bytes=Config.ENCODED_CACHE_BYTES)
+
+
+# Per-process cache of small, frequently served image files (see routes/media_routes.py)
+image_cache = FileCache(Config.IMAGE_CACHE_BYTES, Config.IMAGE_CACHE_MAX_FILE)
+
+
+def get_version(db, name):
+    """Return the current version token of collection `name`.
+
+    The token lives in the `catalog_versions` collection and is read through the
+    catalog cache, so answering a conditional GET normally costs no Mongo query.
+    """
+    def load():
+        doc = db.catalog_versions.find_one({"_id": name})
+        return str(doc["version"]) if doc else "0"
+
+    return catalog_cache.get_or_load((name, "version"), load)
+
+
+def invalidate_collection(db, name, item_id=None):
+    """Record a write to collection `name`: bump its version and drop stale cache entries."""
+    db.catalog_versions.update_one({"_id": name}, {"$set": {"version": ObjectId()}}, upsert=True)
+    catalog_cache.invalidate(name, item_id)
+
+
+def conditional(db, name):
+    """Decorator giving a GET view a strong ETag derived from the collection version.
+
+    `name` may also be a tuple of collections for views that read several;
+    the ETag then changes when any of them does.
+
+    A matching If-None-Match is answered with 304 before the view runs, so
+    neither the query nor the body serialization happens. A body already
+    compressed for this ETag (see compression.py) is sent without running the
+    view either.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            names = (name,) if isinstance(name, str) else name
+            version = "+".join(str(get_version(db, n)) for n in names)
+            representation = "ndjson" if wants_ndjson() else "json"
+            etag = hashlib.sha1(f"{name}:{version}:{representation}:{request.full_path}".encode()).hexdigest()
+            encoding = negotiate_encoding()
+            encoded = encoded_cache.get((name, "encoded", etag, encoding)) if encoding else None
+
+            # Compressed representations carry the encoding as an ETag suffix
+            matched = next((tag for tag in (etag, f"{etag}-gzip", f"{etag}-br") if request.if_none_match.contains(tag)), None)
+            if matched:
+                response = make_response("", 304)
+                response.set_etag(matched)
+            elif encoded is not None:
+                response = make_response(encoded)
+                response.mimetype = "application/json"
+                response.headers["Content-Encoding"] = encoding
+                response.set_etag(f"{etag}-{encoding}")
+                response.vary.add("Accept-Encoding")
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+                g.encoded_cache_key = (name, "encoded", etag)
+            response.cache_control.no_cache = True
+            response.vary.add("Accept")
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,409 @@
+import csv
+import io
+import json
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import Config
+from cache import invalidate_collection
+from utils import json_default
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib decoder
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: parquet export is unavailable without it
+    pyarrow = None
+
+# Collections that can be imported and exported, with their parent reference (field, collection)
+IMPORT_TARGETS = {
+    "tshirts": None,
+    "hoodies": None,
+    "combos": None,
+    "products": None,
+    "tshirts_details": ("tshirt_id", "tshirts"),
+    "hoodies_details": ("hoodie_id", "hoodies"),
+    "combos_details": ("combo_id", "combos"),
+}
+
+FORMATS = ("ndjson", "csv")
+EXPORT_FORMATS = FORMATS + ("parquet",)
+
+
+def parse_price(price):
+    """Same price handling as the models: strings may contain thousands separators."""
+    if isinstance(price, str):
+        return float(price.replace(",", ""))
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return float(price)
+    raise ValueError("Invalid price format. Must be a string, int, or float.")
+
+
+def _decoded_lines(stream):
+    """Decode a binary stream line by line, so a bad byte is pinned to its own line."""
+    for line in stream:
+        yield line.decode("utf-8")
+
+
+def read_rows(stream, fmt):
+    """Yield the rows of a binary NDJSON or CSV stream one at a time.
+
+    A row that cannot be decoded is yielded as the ValueError describing it,
+    so one bad line is reported without ending the import. In CSV a record
+    may span lines, so there invalid UTF-8 ends the import instead.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(_decoded_lines(stream))
+        return
+
+    loads = orjson.loads if orjson is not None else json.loads
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = loads(line.decode("utf-8"))
+        except UnicodeDecodeError as e:
+            yield ValueError(f"Invalid UTF-8: {e}")
+            continue
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+            continue
+        yield row if isinstance(row, dict) else ValueError("Row must be a JSON object")
+
+
+def validate_row(row, parent=None):
+    """Turn one input row into the document the create route would insert."""
+    name = row.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Missing name")
+    if row.get("price") in (None, ""):
+        raise ValueError("Missing price")
+    try:
+        price = parse_price(row["price"])
+    except ValueError:
+        raise ValueError(f"Invalid price: {row['price']!r}")
+    image_url = row.get("image_url")
+    if not isinstance(image_url, str) or not image_url:
+        raise ValueError("Missing image_url")
+
+    doc = {"name": name, "price": price, "image_url": image_url}
+    if parent:
+        field, _ = parent
+        try:
+            doc[field] = str(ObjectId(row.get(field)))
+        except (InvalidId, TypeError):
+            raise ValueError(f"Invalid {field}")
+    return doc
+
+
+def _insert_batch(db, collection, batch, parent, report):
+    """Insert one batch of (row number, document) pairs with a single unordered insert_many."""
+    if parent:
+        field, parent_collection = parent
+        wanted = {ObjectId(doc[field]) for _, doc in batch}
+        found = {str(d["_id"]) for d in db[parent_collection].find({"_id": {"$in": list(wanted)}}, {"_id": 1})}
+        missing = [(number, doc) for number, doc in batch if doc[field] not in found]
+        for number, doc in missing:
+            _record_error(report, number, f"{field} {doc[field]} not found")
+        batch = [(number, doc) for number, doc in batch if doc[field] in found]
+    if not batch:
+        return
+
+    try:
+        result = db[collection].insert_many([doc for _, doc in batch], ordered=False)
+        report["inserted"] += len(result.inserted_ids)
+    except BulkWriteError as e:
+        report["inserted"] += e.details.get("nInserted", 0)
+        for error in e.details.get("writeErrors", []):
+            _record_error(report, batch[error["index"]][0], error.get("errmsg", "Write error"))
+
+
+def _record_error(report, number, message):
+    report["failed"] += 1
+    if len(report["errors"]) < Config.IMPORT_MAX_ERRORS:
+        report["errors"].append({"row": number, "error": message})
+
+
+def import_rows(db, collection, rows, batch_size=None):
+    """Validate `rows` in one streaming pass and insert them in batches.
+
+    Only one batch is held in memory at a time. Returns a report with the
+    inserted and failed counts and up to IMPORT_MAX_ERRORS per-row errors,
+    numbered from 1 in input order.
+
+    Batches are committed as the input is read, so an import can stop part
+    way: a body that cannot be read any further is recorded as an error on
+    the row where reading stopped, and a database error is set as
+    `report["error"]`. Either way `report["complete"]` is False and the
+    report covers the rows inserted before it stopped.
+    """
+    if collection not in IMPORT_TARGETS:
+        raise ValueError(f"Cannot import into {collection}")
+    parent = IMPORT_TARGETS[collection]
+    batch_size = batch_size or Config.IMPORT_BATCH_SIZE
+
+    report = {"collection": collection, "inserted": 0, "failed": 0, "errors": [], "complete": True}
+    batch = []
+    number = 0
+    try:
+        try:
+            for number, row in enumerate(rows, 1):
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    batch.append((number, validate_row(row, parent)))
+                except ValueError as e:
+                    _record_error(report, number, str(e))
+                if len(batch) >= batch_size:
+                    _insert_batch(db, collection, batch, parent, report)
+                    batch = []
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Nothing after this point can be read; keep the rows read before it
+            _record_error(report, number + 1, f"Unreadable body, import stopped: {e}")
+            report["complete"] = False
+        _insert_batch(db, collection, batch, parent, report)
+    except PyMongoError as e:
+        report["error"] = f"Database error, import stopped: {e}"
+        report["complete"] = False
+    finally:
+        # Also reached when reading the body fails some other way: rows
+        # already inserted must not be hidden behind cached lists and ETags
+        if report["inserted"]:
+            invalidate_collection(db, collection)
+    report["errors"].sort(key=lambda error: error["row"])
+    return report
+
+
+def export_fields(collection):
+    """Columns of an export, in order."""
+    parent = IMPORT_TARGETS[collection]
+    return ["_id", "name", "price", "image_url"] + ([parent[0]] if parent else [])
+
+
+def parse_id_range(after=None, until=None):
+    """Build the `_id` range filter for `after` (exclusive) and `until` (inclusive) ids."""
+    bounds = {}
+    try:
+        if after:
+            bounds["$gt"] = ObjectId(after)
+        if until:
+            bounds["$lte"] = ObjectId(until)
+    except (InvalidId, TypeError):
+        raise ValueError("after and until must be document ids")
+    return {"_id": bounds} if bounds else {}
+
+
+def partition_ranges(db, collection, query, partitions):
+    """Split `query` into up to `partitions` consecutive `_id` ranges of similar size.
+
+    The split points are read from the _id index (a covered skip), so no
+    document is fetched.
+    """
+    count = db[collection].count_documents(query)
+    if partitions <= 1 or count < partitions * Config.STREAM_BATCH_SIZE:
+        return [query]
+
+    step = count // partitions
+    cuts = []
+    for i in range(1, partitions):
+        doc = next(db[collection].find(query, {"_id": 1}).sort("_id", 1).skip(i * step).limit(1), None)
+        if doc:
+            cuts.append(doc["_id"])
+
+    ranges, lower = [], None
+    for cut in cuts + [None]:
+        bounds = dict(query.get("_id", {}))
+        if lower is not None:
+            bounds["$gt"] = lower
+        if cut is not None:
+            bounds["$lte"] = cut
+        ranges.append({**query, "_id": bounds})
+        lower = cut
+    return ranges
+
+
+def _read_range(db, collection, query, fields):
+    cursor = db[collection].find(query, dict.fromkeys(fields, 1)).sort("_id", 1)
+    return cursor.batch_size(Config.STREAM_BATCH_SIZE)
+
+
+def _put(out, item, stop):
+    """Put `item` on the bounded queue unless the export was abandoned."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _prefetch(db, collection, query, fields, out, stop):
+    """Worker: push batches of one range into the bounded queue `out`, then None."""
+    try:
+        batch = []
+        for doc in _read_range(db, collection, query, fields):
+            batch.append(doc)
+            if len(batch) >= Config.STREAM_BATCH_SIZE:
+                if not _put(out, batch, stop):
+                    return
+                batch = []
+        if batch and not _put(out, batch, stop):
+            return
+        _put(out, None, stop)
+    except Exception as e:
+        _put(out, e, stop)
+
+
+def iter_export(db, collection, query=None, partitions=1):
+    """Yield the documents of `collection` matching `query` in `_id` order.
+
+    With several partitions the ranges are read by parallel threads, each
+    at most EXPORT_PREFETCH_BATCHES batches ahead, and emitted in order, so
+    the output is the same as a single cursor and memory stays bounded.
+    """
+    fields = export_fields(collection)
+    ranges = partition_ranges(db, collection, query or {}, partitions)
+    if len(ranges) == 1:
+        yield from _read_range(db, collection, ranges[0], fields)
+        return
+
+    queues = [queue.Queue(maxsize=Config.EXPORT_PREFETCH_BATCHES) for _ in ranges]
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(ranges))
+    try:
+        for r, q in zip(ranges, queues):
+            executor.submit(_prefetch, db, collection, r, fields, q, stop)
+        for q in queues:
+            while True:
+                batch = q.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield from batch
+    finally:
+        # Also reached when the client goes away mid-export
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _chunked(pieces):
+    """Join small str/bytes pieces into ~STREAM_CHUNK_SIZE byte chunks."""
+    buffer, size = [], 0
+    for piece in pieces:
+        if isinstance(piece, str):
+            piece = piece.encode()
+        buffer.append(piece)
+        size += len(piece)
+        if size >= Config.STREAM_CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _ndjson_pieces(docs):
+    for doc in docs:
+        if orjson is not None:
+            yield orjson.dumps(doc, default=json_default, option=orjson.OPT_APPEND_NEWLINE)
+        else:
+            yield json.dumps(doc, default=json_default) + "\n"
+
+
+def _csv_pieces(docs, fields):
+    line = io.StringIO()
+    writer = csv.writer(line)
+    writer.writerow(fields)
+    for doc in docs:
+        writer.writerow([str(doc["_id"])] + [doc.get(field, "") for field in fields[1:]])
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _parquet_chunks(docs, fields):
+    """Write one parquet row group per STREAM_BATCH_SIZE documents, yielding bytes as they are written."""
+    types = {"price": pyarrow.float64()}
+    schema = pyarrow.schema([(field, types.get(field, pyarrow.string())) for field in fields])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode="w"), schema)
+
+    def flush(rows):
+        columns = {field: [row.get(field) for row in rows] for field in fields}
+        columns["_id"] = [str(value) for value in columns["_id"]]
+        writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+        return sink.drain()
+
+    rows = []
+    for doc in docs:
+        rows.append(doc)
+        if len(rows) >= Config.STREAM_BATCH_SIZE:
+            yield flush(rows)
+            rows = []
+    if rows:
+        yield flush(rows)
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(db, collection, fmt, query=None, partitions=1):
+    """Serialize an export as a stream of byte chunks in `fmt` (ndjson, csv or parquet)."""
+    if collection not in IMPORT_TARGETS:
+        raise ValueError(f"Cannot export {collection}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if fmt == "parquet" and pyarrow is None:
+        raise ValueError("parquet export needs pyarrow")
+
+    docs = iter_export(db, collection, query, partitions)
+    if fmt == "parquet":
+        return _parquet_chunks(docs, export_fields(collection))
+    if fmt == "csv":
+        return _chunked(_csv_pieces(docs, export_fields(collection)))
+    return _chunked(_ndjson_pieces(docs))
+
+
+def gzip_chunks(chunks):
+    """Gzip a chunk stream on the fly."""
+    compressor = zlib.compressobj(Config.COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,349 @@
+import json
+import sys
+import time
+import click
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from flask import Flask
+from config import Config
+from catalog_io import (
+    EXPORT_FORMATS, FORMATS, IMPORT_TARGETS, export_chunks, gzip_chunks, import_rows, parse_id_range, read_rows,
+)
+from auth import revoke_admin_tokens
+from indexes import ensure_indexes, index_report
+from models.admin_login_model import AdminModel
+from models.user_signup_model import UserModel
+from passwords import HashingBusy
+from resumable import collect_stale_sessions
+from roundtrips import round_trips
+from routes.combo_details_routes import create_combos_details_routes
+from routes.combos_routes import create_combos_routes
+from routes.hoodies_details_routes import create_hoodies_details_routes
+from routes.hoodies_routes import create_hoodies_routes
+from routes.product_routes import create_product_routes
+from routes.tshirt_detail_routes import create_tshirts_details_routes
+from routes.tshirt_routes import create_tshirts_routes
+from storage import UploadRequest
+from sweeper import sweep
+from utils import (
+    CATALOG_COLLECTIONS, CATALOG_PROJECTION, EMAIL_INDEX, SORT_ORDERS, MongoJSONProvider, build_filter, index_exists,
+    normalize_email,
+)
+
+# Item URL prefix of every collection with PUT/DELETE routes, for check-round-trips
+ITEM_ROUTES = {
+    "tshirts": "/tshirts",
+    "hoodies": "/hoodies",
+    "combos": "/combos",
+    "products": "/api/products",
+    "tshirts_details": "/api/tshirts_details",
+    "hoodies_details": "/api/hoodies_details",
+    "combos_details": "/api/combos_details",
+}
+
+# Account collections, whose emails are stored lowercased under a unique index
+ACCOUNT_COLLECTIONS = ("signup", "admin_login")
+
+# Detail collections, whose lists are sorted but not filtered
+DETAILS_COLLECTIONS = ("tshirts_details", "hoodies_details", "combos_details")
+
+# Every filter shape the list endpoints accept, as query-string arguments
+FILTER_SHAPES = (
+    {},
+    {"min_price": "100"},
+    {"max_price": "999"},
+    {"min_price": "100", "max_price": "999"},
+    {"name_prefix": "a"},
+    {"name_prefix": "a", "max_price": "999"},
+)
+
+
+def plan_stages(plan):
+    """Yield every stage name of an explain() plan tree."""
+    yield plan["stage"]
+    for child in plan.get("inputStages", []) + [plan[k] for k in ("inputStage", "outerStage", "innerStage") if k in plan]:
+        yield from plan_stages(child)
+
+
+def item_routes_app(db):
+    """A bare app serving the catalog item routes from `db`, without auth or compression."""
+    app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.config.from_object(Config)
+    app.json = MongoJSONProvider(app)
+    app.register_blueprint(create_tshirts_routes(db))
+    app.register_blueprint(create_hoodies_routes(db))
+    app.register_blueprint(create_combos_routes(db))
+    app.register_blueprint(create_product_routes(db, Config.UPLOAD_FOLDER), url_prefix="/api")
+    app.register_blueprint(create_tshirts_details_routes(db), url_prefix="/api")
+    app.register_blueprint(create_hoodies_details_routes(db), url_prefix="/api")
+    app.register_blueprint(create_combos_details_routes(db), url_prefix="/api")
+    return app
+
+
+def register_commands(app, db):
+    """Attach the maintenance commands to `flask <command>`."""
+
+    @app.cli.command("explain-filters")
+    def explain_filters():
+        """Check that every list filter/sort shape is answered by an index scan."""
+        failures = 0
+        # The details lists take no filters, only the sort orders
+        shapes = [(name, FILTER_SHAPES) for name in CATALOG_COLLECTIONS]
+        shapes += [(name, ({},)) for name in DETAILS_COLLECTIONS]
+        for name, filter_shapes in shapes:
+            for args in filter_shapes:
+                for sort in SORT_ORDERS:
+                    cursor = db[name].find(build_filter(args), CATALOG_PROJECTION).sort(SORT_ORDERS[sort]).limit(25)
+                    winning = cursor.explain()["queryPlanner"]["winningPlan"]
+                    stages = list(plan_stages(winning.get("queryPlan", winning)))
+                    ok = "COLLSCAN" not in stages and "IXSCAN" in stages
+                    failures += not ok
+                    click.echo(f"{'ok  ' if ok else 'FAIL'} {name} {args} sort={sort}: {' <- '.join(stages)}")
+        if failures:
+            click.echo(f"{failures} filter shape(s) are not index-backed")
+            sys.exit(1)
+
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes_command():
+        """Create every index declared by the models."""
+        failed = ensure_indexes(db)
+        if failed:
+            click.echo(f"Could not create the indexes of {', '.join(failed)}")
+            sys.exit(1)
+        click.echo("Indexes are up to date")
+
+    @app.cli.command("index-report")
+    def index_report_command():
+        """Report missing, undeclared and unused indexes; exit non-zero if any are missing."""
+        rows = index_report(db)
+        for collection, index_name, status, detail in rows:
+            click.echo(f"{status:<10} {collection}.{index_name} {detail}".rstrip())
+        if not rows:
+            click.echo("All declared indexes exist and are in use")
+        if any(status == "missing" for _, _, status, _ in rows):
+            sys.exit(1)
+
+    @app.cli.command("gc-upload-sessions")
+    def gc_upload_sessions():
+        """Delete resumable upload sessions idle for longer than UPLOAD_SESSION_TTL."""
+        click.echo(f"Removed {collect_stale_sessions(force=True)} stale upload session(s)")
+
+    @app.cli.command("sweep-uploads")
+    @click.option("--dry-run", is_flag=True, help="Only report what would be quarantined and purged.")
+    @click.option("--full", is_flag=True, help="Ignore the checkpoint and list every directory.")
+    def sweep_uploads(dry_run, full):
+        """Quarantine uploaded files no product references and purge expired quarantine."""
+        report = sweep(db, dry_run=dry_run, full=full)
+        for relpath in report["quarantined"]:
+            click.echo(f"{'would quarantine' if dry_run else 'quarantined'} {relpath}")
+        click.echo(
+            f"{len(report['quarantined'])} file(s), {report['quarantined_bytes']} bytes; "
+            f"{report['pending']} within grace period; "
+            f"{report['purged']} purged ({report['purged_bytes']} bytes); "
+            f"listed {report['listed_directories']} of {report['directories']} directories "
+            f"in {report['seconds']}s"
+        )
+
+    @app.cli.command("import-catalog")
+    @click.argument("collection", type=click.Choice(list(IMPORT_TARGETS)))
+    @click.argument("source", type=click.File("rb"))
+    @click.option("--format", "fmt", type=click.Choice(FORMATS), help="Defaults to csv for *.csv files, else ndjson.")
+    @click.option("--batch-size", type=int, help="Rows per insert_many (default IMPORT_BATCH_SIZE).")
+    def import_catalog(collection, source, fmt, batch_size):
+        """Bulk import NDJSON or CSV rows from SOURCE ('-' for stdin) into COLLECTION."""
+        fmt = fmt or ("csv" if source.name.endswith(".csv") else "ndjson")
+        start = time.perf_counter()
+        report = import_rows(db, collection, read_rows(source, fmt), batch_size)
+        for error in report["errors"]:
+            click.echo(f"row {error['row']}: {error['error']}", err=True)
+        if "error" in report:
+            click.echo(report["error"], err=True)
+        click.echo(f"{report['inserted']} inserted, {report['failed']} failed in {time.perf_counter() - start:.2f}s")
+        if report["failed"] or not report["complete"]:
+            sys.exit(1)
+
+    @app.cli.command("export-catalog")
+    @click.argument("collection", type=click.Choice(list(IMPORT_TARGETS)))
+    @click.argument("target", type=click.File("wb"), default="-")
+    @click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS), default="ndjson")
+    @click.option("--after", help="Start after this _id (resume an interrupted export).")
+    @click.option("--until", help="Stop at this _id (inclusive).")
+    @click.option("--partitions", type=int, default=1, help="Parallel _id-range readers.")
+    @click.option("--gzip", "gzip_output", is_flag=True, help="Gzip the output.")
+    def export_catalog(collection, target, fmt, after, until, partitions, gzip_output):
+        """Stream COLLECTION to TARGET ('-' for stdout) without loading it into memory."""
+        chunks = export_chunks(db, collection, fmt, parse_id_range(after, until), partitions)
+        for chunk in gzip_chunks(chunks) if gzip_output else chunks:
+            target.write(chunk)
+
+    @app.cli.command("bench-json")
+    @click.option("--items", default=10000, help="Number of catalog documents to serialize")
+    @click.option("--repeat", default=5, help="Runs per variant; the best run is reported")
+    def bench_json(items, repeat):
+        """Time serializing a catalog list: stdlib + str(_id) rebuild vs the app JSON provider."""
+        docs = [
+            {"_id": ObjectId(), "name": f"T-shirt {i}", "price": 499.0 + i, "image_url": f"http://localhost/uploads/tshirts/{i}.jpg"}
+            for i in range(items)
+        ]
+
+        def legacy():
+            rebuilt = [{"_id": str(d["_id"]), "name": d["name"], "price": d["price"], "image_url": d["image_url"]} for d in docs]
+            return json.dumps(rebuilt)
+
+        def provider():
+            return app.json.dumps(docs)
+
+        for label, run in (("stdlib json + str(_id) rebuild", legacy), ("app.json provider", provider)):
+            best = min(_timed(run) for _ in range(repeat))
+            click.echo(f"{label:<32} {best * 1000:8.2f} ms for {items} items")
+
+    @app.cli.command("create-admin")
+    @click.argument("name")
+    @click.argument("email")
+    @click.password_option()
+    def create_admin_command(name, email, password):
+        """Create an admin account (the first one cannot be created over HTTP)."""
+        if not AdminModel(db).create_admin(name, email, password):
+            click.echo(f"An admin with email {email} already exists")
+            sys.exit(1)
+        click.echo(f"Created admin {email}")
+
+    @app.cli.command("revoke-admin-tokens")
+    @click.argument("email")
+    def revoke_admin_tokens_command(email):
+        """Reject every token issued so far to the admin with EMAIL."""
+        admin = AdminModel(db).get_admin_by_email(email)
+        if not admin:
+            click.echo(f"No admin with email {email}")
+            sys.exit(1)
+        revoke_admin_tokens(db, admin["_id"])
+        click.echo(f"Revoked the tokens of {email}; other processes stop accepting them within {Config.AUTH_ADMIN_TTL}s")
+
+    @app.cli.command("normalize-emails")
+    @click.option("--dry-run", is_flag=True, help="Only report what would change.")
+    def normalize_emails(dry_run):
+        """Lowercase stored account emails, then build the unique email indexes.
+
+        Of accounts whose emails differ only in case, the oldest keeps the
+        email; the others are moved to <collection>_email_conflicts to be
+        merged or removed by hand.
+        """
+        for name in ACCOUNT_COLLECTIONS:
+            owners, updates, conflicts = {}, [], []
+            for doc in db[name].find({}, {"email": 1}).sort("_id", 1):
+                email = doc.get("email")
+                if not isinstance(email, str):
+                    continue
+                normalized = normalize_email(email)
+                if normalized in owners:
+                    conflicts.append(doc["_id"])
+                    click.echo(f"{name}: {email} ({doc['_id']}) duplicates account {owners[normalized]}")
+                    continue
+                owners[normalized] = doc["_id"]
+                if email != normalized:
+                    updates.append((doc["_id"], normalized))
+
+            click.echo(f"{name}: {len(updates)} email(s) to lowercase, {len(conflicts)} duplicate account(s)")
+            if dry_run:
+                continue
+            if conflicts:
+                # Set the duplicates aside before lowercasing, so no update collides with them
+                db[f"{name}_email_conflicts"].insert_many(db[name].find({"_id": {"$in": conflicts}}))
+                db[name].delete_many({"_id": {"$in": conflicts}})
+            for account_id, normalized in updates:
+                db[name].update_one({"_id": account_id}, {"$set": {"email": normalized}})
+
+        if dry_run:
+            return
+        ensure_indexes(db)
+        missing = [name for name in ACCOUNT_COLLECTIONS if not index_exists(db[name], EMAIL_INDEX)]
+        if missing:
+            click.echo(f"The unique email index could not be built on {', '.join(missing)}")
+            sys.exit(1)
+        click.echo("Emails are normalized and the unique email indexes exist")
+
+    @app.cli.command("check-round-trips")
+    def check_round_trips():
+        """PUT and DELETE a scratch item of every collection; fail unless each makes exactly the expected commands.
+
+        Runs in a scratch database, through a bare app serving the same item
+        routes, so live data, caches and catalog versions are not touched.
+        """
+        scratch = db.client[f"{db.name}_round_trip_check"]
+        client = item_routes_app(scratch).test_client()
+        failures = 0
+        try:
+            for collection, prefix in ITEM_ROUTES.items():
+                doc = {"name": "round-trip check", "price": 1.0, "image_url": "http://localhost/uploads/round-trip-check.jpg"}
+                parent = IMPORT_TARGETS[collection]
+                if parent:
+                    doc[parent[0]] = str(ObjectId())
+                item_id = scratch[collection].insert_one(doc).inserted_id
+                # One findAndModify on the item, plus the version bump that invalidates cached reads
+                expected = [("findAndModify", collection), ("update", "catalog_versions")]
+
+                for method, data in (("PUT", {"price": "2"}), ("DELETE", None)):
+                    with round_trips.recording() as log:
+                        response = client.open(f"{prefix}/{item_id}", method=method, data=data)
+                    ok = response.status_code == 200 and log == expected
+                    failures += not ok
+                    click.echo(
+                        f"{'ok  ' if ok else 'FAIL'} {method:<6} {collection}: {response.status_code}, {len(log)} command(s): "
+                        f"{', '.join(f'{name} {target}' for name, target in log) or 'none'}"
+                    )
+        finally:
+            db.client.drop_database(scratch.name)
+        if not round_trips.stats()["total"]:
+            click.echo("No commands were recorded; is round_trips registered on the MongoClient?")
+            sys.exit(1)
+        if failures:
+            sys.exit(1)
+
+    @app.cli.command("stress-signups")
+    @click.option("--emails", default=20, help="Distinct emails to register")
+    @click.option("--attempts", default=50, help="Signups per email, alternating upper and lower case")
+    @click.option("--threads", default=64, help="Signups in flight at once")
+    def stress_signups(emails, attempts, threads):
+        """Race concurrent signups in a scratch database; fail unless every email has exactly one winner."""
+        scratch = db.client[f"{db.name}_signup_stress"]
+        model = UserModel(scratch)
+        model.collection.drop()
+        model.collection.create_indexes(UserModel.INDEXES)
+
+        def attempt(i):
+            email = f"stress{i % emails}@example.com"
+            if i // emails % 2:
+                email = email.upper()
+            while True:
+                try:
+                    return email.lower(), model.create_user("stress", email, "stress-password")
+                except HashingBusy:
+                    time.sleep(0.01)  # the hashing pool sheds load; retry like a client would
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                results = list(executor.map(attempt, range(emails * attempts)))
+            stored = model.collection.count_documents({})
+        finally:
+            db.client.drop_database(scratch.name)
+
+        winners = Counter(email for email, created in results if created)
+        wrong = [email for email in {email for email, _ in results} if winners[email] != 1]
+        click.echo(
+            f"{len(results)} signups for {emails} emails in {time.perf_counter() - start:.1f}s: "
+            f"{sum(winners.values())} accepted, {stored} stored"
+        )
+        for email in sorted(wrong):
+            click.echo(f"FAIL {email}: {winners[email]} accepted")
+        if wrong or stored != emails:
+            sys.exit(1)
+
+
+
+def _timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
@@ -0,0 +1,36 @@
+from flask import g
+from config import Config
+from cache import encoded_cache
+from utils import compress_body, negotiate_encoding
+
+
+def init_compression(app):
+    """Compress JSON responses according to Accept-Encoding.
+
+    Bodies of catalog responses guarded by `cache.conditional` are stored with
+    their ETag in `encoded_cache`, so each catalog version is compressed once
+    rather than on every request.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed or not response.is_json
+                or response.status_code != 200 or "Content-Encoding" in response.headers):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate_encoding()
+        if not encoding or (response.content_length or 0) < Config.COMPRESS_MIN_SIZE:
+            return response
+
+        body = compress_body(response.get_data(), encoding)
+        cache_key = g.pop("encoded_cache_key", None)
+        if cache_key is not None:
+            encoded_cache.set(cache_key + (encoding,), body)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
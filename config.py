@@ -8,4 +8,87 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}  # Allowed file extensions for images
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Max upload size of 16MB
 
-    SECRET_KEY = "your-secret-key" 
\ No newline at end of file
+    SECRET_KEY = "your-secret-key" 
+
+    # Password hashing for signup and login, done in a separate process pool
+    PASSWORD_HASH_METHOD = "scrypt"  # werkzeug method, e.g. "pbkdf2:sha256:600000"; older hashes are upgraded at login
+    PASSWORD_HASH_WORKERS = 2  # Worker processes; 0 hashes on the request thread
+    PASSWORD_HASH_QUEUE_SIZE = 16  # Hash jobs running or waiting before requests get 503
+
+    # Admin tokens (Authorization: Bearer <token from /admin-login>) on write requests
+    ADMIN_AUTH_REQUIRED = True  # Admin signup needs a token even when this is off
+    ADMIN_TOKEN_TTL = 3600  # Lifetime of issued tokens
+    AUTH_TOKEN_CACHE_SIZE = 4096  # Verified tokens remembered, each until its exp
+    AUTH_ADMIN_CACHE_SIZE = 1024
+    AUTH_ADMIN_TTL = 30  # How long an admin lookup, and so a revocation made elsewhere, may be stale
+
+    # Keyset pagination for the catalog list endpoints
+    DEFAULT_PAGE_SIZE = 24
+    MAX_PAGE_SIZE = 100
+
+    # In-process catalog read cache (entries, seconds)
+    CATALOG_CACHE_SIZE = 1024
+    CATALOG_CACHE_TTL = 60
+
+    # Streaming list responses (?stream=1 or Accept: application/x-ndjson)
+    STREAM_BATCH_SIZE = 500  # Documents per Mongo cursor batch
+    STREAM_CHUNK_SIZE = 64 * 1024  # Bytes of JSON per response chunk
+
+    # Worker threads used by /api/catalog to query categories concurrently
+    CATALOG_FETCH_WORKERS = 8
+
+    # Compression of JSON responses (gzip, or brotli when installed)
+    COMPRESS_MIN_SIZE = 1024  # Smaller bodies are sent as is
+    COMPRESS_LEVEL = 6  # gzip level, 1-9
+    COMPRESS_BR_QUALITY = 5  # brotli quality, 0-11
+    ENCODED_CACHE_SIZE = 1024  # Compressed catalog bodies kept per ETag and encoding
+    ENCODED_CACHE_BYTES = 64 * 1024 * 1024
+
+    # Uploads are copied and hashed in chunks of this many bytes
+    UPLOAD_CHUNK_SIZE = 64 * 1024
+
+    # Background generation of resized image variants (needs Pillow)
+    THUMBNAIL_WORKERS = 2  # Worker processes
+    THUMBNAIL_QUEUE_SIZE = 64  # Pending jobs before new ones are dropped
+    THUMBNAIL_WIDTHS = (160, 320, 640, 1280)
+    THUMBNAIL_QUALITY = 80
+
+    # On-the-fly resizing of served images (/uploads/...?w=&q=, needs Pillow)
+    RESIZE_CACHE_FOLDER = os.path.join(os.getcwd(), 'cache', 'renditions')
+    RESIZE_CACHE_BYTES = 512 * 1024 * 1024  # Disk budget for cached renditions
+    RESIZE_MAX_WIDTH = 2048
+    RESIZE_DEFAULT_QUALITY = 80
+
+    # Serving of /uploads/...
+    MEDIA_MAX_AGE = 365 * 24 * 3600  # Content-addressed files under media/ (immutable)
+    UPLOAD_MAX_AGE = 24 * 3600  # Legacy per-category files, revalidated with ETag
+    MEDIA_OFFLOAD = None  # None, "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd)
+    MEDIA_ACCEL_PREFIX = "/protected-uploads/"  # nginx internal location aliasing uploads/
+
+    # In-memory cache of small image files served from /uploads (bytes)
+    IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+    IMAGE_CACHE_MAX_FILE = 256 * 1024  # Larger files are always read from disk
+
+    # Resumable uploads (/api/uploads)
+    UPLOAD_SESSION_TTL = 24 * 3600  # Idle sessions older than this are deleted
+    UPLOAD_SESSION_GC_INTERVAL = 15 * 60  # Minimum seconds between automatic sweeps
+
+    # Sweeper for uploaded files no document references (`flask sweep-uploads`)
+    SWEEP_INTERVAL = None  # Seconds between background sweeps; None disables the thread
+    SWEEP_GRACE = 3600  # Files younger than this are never swept
+    SWEEP_QUARANTINE_TTL = 7 * 24 * 3600  # Quarantined files are deleted after this
+    SWEEP_LEASE_TTL = 15 * 60
+
+    # Bulk import (POST /api/import, `flask import-catalog`)
+    IMPORT_BATCH_SIZE = 1000  # Rows per insert_many
+    IMPORT_MAX_ERRORS = 100  # Row errors listed in the report
+    IMPORT_MAX_SIZE = 512 * 1024 * 1024  # Request body limit for /api/import
+
+    # Bulk export (GET /api/export/<collection>, `flask export-catalog`)
+    EXPORT_PREFETCH_BATCHES = 4  # Batches each parallel range reader may run ahead
+
+    # Bulk update/delete (PATCH/DELETE /api/<collection>/bulk)
+    BULK_MAX_ITEMS = 10000
+
+    # Debugging: X-DB-Round-Trips response header (MongoDB commands sent per request)
+    DB_ROUND_TRIP_HEADER = False
@@ -0,0 +1,96 @@
+import threading
+from pymongo.errors import OperationFailure, PyMongoError
+from models.tshirt_model import TshirtModel
+from models.hoodies_model import HoodieModel
+from models.combos_model import CombosModel
+from models.product_models import ProductModel
+from models.tshirt_details_model import TshirtsDetailsModel
+from models.hoodies_details_models import HoodiesDetailsModel
+from models.combos_details_model import CombosDetailsModel
+from models.user_signup_model import UserModel
+from models.user_login_model import LoginModel
+from models.admin_login_model import AdminModel
+
+# Registry of models whose INDEXES are created when the app starts
+INDEXED_MODELS = (
+    TshirtModel, HoodieModel, CombosModel, ProductModel,
+    TshirtsDetailsModel, HoodiesDetailsModel, CombosDetailsModel,
+    UserModel, LoginModel, AdminModel,
+)
+
+
+def declared_indexes(db):
+    """Map each collection name to the {index name: IndexModel} its models declare.
+
+    Several models may share a collection (signup is used by UserModel and
+    LoginModel); identical declarations collapse into one entry.
+    """
+    declared = {}
+    for model in INDEXED_MODELS:
+        collection = model(db).collection
+        for index in model.INDEXES:
+            declared.setdefault(collection.name, {})[index.document["name"]] = index
+    return declared
+
+
+def ensure_indexes(db):
+    """Create every declared index. Indexes that already exist are left untouched.
+
+    Returns the names of the collections whose indexes could not be created.
+    """
+    failed = []
+    for name, indexes in declared_indexes(db).items():
+        try:
+            db[name].create_indexes(list(indexes.values()))
+        except PyMongoError as e:
+            print(f"Error creating indexes on {name}: {e}")
+            failed.append(name)
+    return failed
+
+
+def init_indexes(app, db):
+    """Create the declared indexes in a background thread when the first request arrives.
+
+    Not at import time: every `flask` command imports the app, and with
+    MongoDB unreachable each would first wait out server selection for every
+    collection. Nor in the request itself, since building an index over a
+    large collection can take minutes. `flask ensure-indexes` does the same
+    on demand.
+    """
+    started = threading.Event()
+
+    @app.before_request
+    def start_index_build():
+        if started.is_set():
+            return
+        started.set()
+        threading.Thread(target=ensure_indexes, args=(db,), name="ensure-indexes", daemon=True).start()
+
+
+def index_report(db):
+    """Compare declared indexes with the live ones and their `$indexStats` usage.
+
+    Returns a list of `(collection, index name, status, detail)` rows where
+    status is "missing" (declared, not built), "undeclared" (built, not
+    declared) or "unused" (built, no accesses since the server last started).
+    """
+    rows = []
+    for name, declared in sorted(declared_indexes(db).items()):
+        existing = db[name].index_information()
+        try:
+            usage = {s["name"]: s["accesses"] for s in db[name].aggregate([{"$indexStats": {}}])}
+        except OperationFailure:
+            usage = {}  # $indexStats needs clusterMonitor; report without usage data
+
+        for index_name in declared:
+            if index_name not in existing:
+                rows.append((name, index_name, "missing", ""))
+        for index_name in existing:
+            if index_name == "_id_":
+                continue
+            if index_name not in declared:
+                rows.append((name, index_name, "undeclared", ""))
+            accesses = usage.get(index_name)
+            if accesses is not None and accesses["ops"] == 0:
+                rows.append((name, index_name, "unused", f"no accesses since {accesses['since']}"))
+    return rows
@@ -1,29 +1,38 @@
-from werkzeug.security import generate_password_hash, check_password_hash
+from pymongo import ASCENDING, IndexModel
 from flask_pymongo import PyMongo
+from passwords import hash_password, verify_password
+from utils import EMAIL_COLLATION, EMAIL_INDEX, find_by_email, insert_account
 
 class AdminModel:
+    # Emails are unique regardless of case; signup relies on the index to reject duplicates
+    INDEXES = [IndexModel([("email", ASCENDING)], name=EMAIL_INDEX, unique=True, collation=EMAIL_COLLATION)]
+
     def __init__(self, db):
         self.collection = db.admin_login  # Collection name is admin_signup
 
     def is_email_registered(self, email):
         """Check if the email is already registered."""
-        return self.collection.find_one({"email": email})
+        return find_by_email(self.collection, email)
 
     def create_admin(self, name, email, password):
-        """Insert a new admin into the database."""
-        hashed_password = generate_password_hash(password)
+        """Insert a new admin; return False if the email is already registered (in any case)."""
+        hashed_password = hash_password(password)
         admin_data = {
             "name": name,
             "email": email,
             "password": hashed_password
         }
-        self.collection.insert_one(admin_data)
-        return True
+        return insert_account(self.collection, admin_data)
 
     def get_admin_by_email(self, email):
         """Retrieve an admin by email."""
-        return self.collection.find_one({"email": email})
+        return find_by_email(self.collection, email)
 
-    def check_password(self, stored_password, provided_password):
-        """Check if the provided password matches the stored hashed password."""
-        return check_password_hash(stored_password, provided_password)
+    def check_password(self, admin, provided_password):
+        """Check the provided password against the stored hash, upgrading the hash if it is outdated."""
+        matches, new_hash = verify_password(admin["password"], provided_password)
+        if new_hash:
+            self.collection.update_one(
+                {"_id": admin["_id"], "password": admin["password"]}, {"$set": {"password": new_hash}}
+            )
+        return matches
@@ -1,7 +1,16 @@
+from pymongo import ASCENDING, IndexModel
 from pymongo.errors import PyMongoError
 from bson import ObjectId
+from config import Config
+from utils import CATALOG_PROJECTION, SORT_ORDERS
 
 class HoodieModel:
+    # Indexes backing the list filters and sort orders (see utils.build_filter)
+    INDEXES = [
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)]),
+    ]
+
     def __init__(self, db):
         self.collection = db["hoodies"]
 
@@ -20,21 +29,19 @@ class HoodieModel:
 
     def get_all_items(self):
         try:
-            items = self.collection.find()
-            return [
-                {
-                    "_id": str(item["_id"]),
-                    "id": str(item["_id"]),
-                    "name": item["name"],
-                    "price": item["price"],
-                    "image_url": item["image_url"]
-                }
-                for item in items
-            ]
+            return [dict(item, id=item["_id"]) for item in self.iter_items()]
         except PyMongoError as e:
             print(f"Error retrieving items: {e}")
             return []
 
+    def iter_items(self, query=None, sort=None):
+        """Yield items straight from the cursor so large lists can be streamed.
+
+        Items have the shape of the non-streamed list (catalog_list).
+        """
+        items = self.collection.find(query or {}, CATALOG_PROJECTION).sort(SORT_ORDERS[sort])
+        yield from items.batch_size(Config.STREAM_BATCH_SIZE)
+
     def get_item_by_id(self, item_id):
         try:
             item = self.collection.find_one({"_id": ObjectId(item_id)})
@@ -55,10 +62,10 @@ class HoodieModel:
             if "price" in update_data:
                 update_data["price"] = float(update_data["price"].replace(",", ""))
 
-            result = self.collection.update_one(
-                {"_id": ObjectId(item_id)}, {"$set": update_data}
+            item = self.collection.find_one_and_update(
+                {"_id": ObjectId(item_id)}, {"$set": update_data}, projection={"_id": 1}
             )
-            return result.modified_count > 0
+            return item is not None
         except PyMongoError as e:
             print(f"Error updating item: {e}")
             return False
@@ -1,7 +1,14 @@
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, ReturnDocument
 
 
 class ProductModel:
+    # Indexes backing the list filters and sort orders (see utils.build_filter)
+    INDEXES = [
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)]),
+    ]
+
     def __init__(self, db):
         self.collection = db.products  # Reference to the 'products' collection in MongoDB
 
@@ -26,7 +33,6 @@ class ProductModel:
         try:
             product = self.collection.find_one({"_id": ObjectId(product_id)})
             if product:
-                product["_id"] = str(product["_id"])  # Convert ObjectId to string for JSON serialization
                 return product, 200
             return {"message": "Product not found"}, 404
         except Exception as e:
@@ -37,8 +43,6 @@ class ProductModel:
     def get_all_products(self):
         try:
             products = list(self.collection.find({}, {"name": 1, "price": 1, "image_url": 1}))
-            for product in products:
-                product["_id"] = str(product["_id"])  # Convert ObjectId to string for JSON serialization
             return products, 200
         except Exception as e:
             print(f"Error fetching products: {e}")
@@ -51,12 +55,11 @@ class ProductModel:
             if "price" in update_data:
                 update_data["price"] = float(update_data["price"])  # Ensure price is stored as a float
 
-            result = self.collection.update_one({"_id": ObjectId(product_id)}, {"$set": update_data})
-            if result.modified_count == 0:
-                return {"message": "Product not found or no changes made"}, 404
-
-            updated_product = self.collection.find_one({"_id": ObjectId(product_id)})
-            updated_product["_id"] = str(updated_product["_id"])  # Convert ObjectId to string
+            updated_product = self.collection.find_one_and_update(
+                {"_id": ObjectId(product_id)}, {"$set": update_data}, return_document=ReturnDocument.AFTER
+            )
+            if updated_product is None:
+                return {"message": "Product not found"}, 404
             return updated_product, 200
         except Exception as e:
             print(f"Error updating product: {e}")
@@ -1,7 +1,18 @@
+from pymongo import ASCENDING, IndexModel
 from pymongo.errors import PyMongoError
 from bson import ObjectId
+from config import Config
+from utils import CATALOG_PROJECTION, SORT_ORDERS, encode_cursor, keyset_query, paginate, set_fields
 
 class TshirtsDetailsModel:
+    # get_item_by_id and get_full look details up by their parent tshirt (in _id order);
+    # the other two back the price and name sort orders of the list
+    INDEXES = [
+        IndexModel([("tshirt_id", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)]),
+    ]
+
     def __init__(self, db):
         self.collection = db["tshirts_details"]
 
@@ -30,42 +41,74 @@ class TshirtsDetailsModel:
 
 
     # READ: Get all products
-    def get_all_items(self):
+    def get_all_items(self, limit=None, after=None, sort=None):
         try:
-            items = self.collection.find()
-            return [
-                {
-                    "tshirt_detail_id": str(item["_id"]),
-                    "name": item["name"],
-                    "price": item["price"],
-                    "image_url": item["image_url"],
-                    "tshirt_id": str(item["tshirt_id"])
-                }
-                for item in items
-            ]
+            items, next_cursor = paginate(self.collection, {}, None, limit, after, sort)
+            return [self._serialize(item) for item in items], next_cursor
         except PyMongoError as e:
             print(f"Error retrieving items: {e}")
-            return []
+            return [], None
+
+    # READ: Stream all products straight from the cursor
+    def iter_items(self, query=None, sort=None):
+        items = self.collection.find(query or {}).sort(SORT_ORDERS[sort]).batch_size(Config.STREAM_BATCH_SIZE)
+        for item in items:
+            yield self._serialize(item)
 
     # READ: Get a product by ID
     def get_item_by_id(self, item_id):
         try:
             item = self.collection.find_one({"tshirt_id": str(item_id)})
             if item:
-                return {
-                    "tshirt_detail_id": str(item["_id"]),
-                    "name": item["name"],
-                    "price": item["price"],
-                    "image_url": item["image_url"],
-                    "tshirt_id": str(item["tshirt_id"])
-                }
+                return self._serialize(item)
             return None
         except PyMongoError as e:
             print(f"Error retrieving item: {e}")
             return None
 
-    # UPDATE: Update product details
+    # READ: A tshirt with its detail rows, joined in one aggregation
+    def get_full(self, tshirt_id, limit=None, after=None):
+        """Return the tshirt plus a `details` list, or None if the tshirt does not exist.
+
+        Database errors are raised, not reported as a missing tshirt.
+
+        The details come from a $lookup on the (tshirt_id, _id) index. With a
+        limit they are paginated like the list endpoints and `next` is added.
+        """
+        details = [{"$sort": {"_id": 1}}]
+        if after:
+            details.insert(0, {"$match": keyset_query({}, after)})
+        if limit is not None:
+            details.append({"$limit": limit + 1})
+        pipeline = [
+            {"$match": {"_id": ObjectId(tshirt_id)}},
+            {"$project": CATALOG_PROJECTION},
+            {"$addFields": {"tshirt_key": {"$toString": "$_id"}}},
+            # localField/foreignField together with a pipeline needs MongoDB 5.0 or later
+            {"$lookup": {
+                "from": "tshirts_details",
+                "localField": "tshirt_key",
+                "foreignField": "tshirt_id",
+                "pipeline": details,
+                "as": "details",
+            }},
+            {"$project": {"tshirt_key": 0}},
+        ]
+        tshirt = next(self.collection.database["tshirts"].aggregate(pipeline), None)
+        if tshirt is None:
+            return None
+
+        items = tshirt.pop("details")
+        if limit is not None:
+            next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+            items = items[:limit]
+            tshirt["next"] = next_cursor
+        tshirt["details"] = [self._serialize(item) for item in items]
+        return tshirt
+
+    # UPDATE: Update product details in one round trip
     def update_item(self, item_id, update_data):
+        """Return `(item, previous_image_url)`, `(None, None)` if there is no such item, or False on error."""
         try:
             if "price" in update_data:
                 price = update_data["price"]
@@ -76,10 +119,10 @@ class TshirtsDetailsModel:
                 else:
                     raise ValueError("Invalid price format")
 
-            result = self.collection.update_one(
-                {"_id": ObjectId(item_id)}, {"$set": update_data}
+            item, previous_image = set_fields(
+                self.collection, item_id, update_data, {**CATALOG_PROJECTION, "tshirt_id": 1}
             )
-            return result.modified_count > 0
+            return (self._serialize(item) if item else None), previous_image
         except PyMongoError as e:
             print(f"Error updating item: {e}")
             return False
@@ -87,12 +130,22 @@ class TshirtsDetailsModel:
             print(f"Error updating item: {ve}")
             return False
 
-    # DELETE: Delete a product
+    # DELETE: Delete a product, returning its image_url (None if not found, False on error)
     def delete_item(self, item_id):
         try:
-            result = self.collection.delete_one({"_id": ObjectId(item_id)})
-            return result.deleted_count > 0
+            return self.collection.find_one_and_delete({"_id": ObjectId(item_id)}, projection={"image_url": 1})
         except PyMongoError as e:
             print(f"Error deleting item: {e}")
             return False
 
+    def _serialize(self, item):
+        data = {
+            "tshirt_detail_id": item["_id"],
+            "name": item["name"],
+            "price": item["price"],
+            "image_url": item["image_url"],
+            "tshirt_id": item["tshirt_id"]
+        }
+        if "image_variants" in item:
+            data["image_variants"] = item["image_variants"]
+        return data
@@ -1,13 +1,23 @@
-from werkzeug.security import check_password_hash
+from pymongo import ASCENDING, IndexModel
+from passwords import verify_password
+from utils import EMAIL_COLLATION, EMAIL_INDEX, find_by_email
 
 class LoginModel:
+    # Emails are unique regardless of case; signup relies on the index to reject duplicates
+    INDEXES = [IndexModel([("email", ASCENDING)], name=EMAIL_INDEX, unique=True, collation=EMAIL_COLLATION)]
+
     def __init__(self, db):
         self.collection = db.signup  # Assuming signup and login share the same collection
 
     def get_user_by_email(self, email):
         """Retrieve a user by email."""
-        return self.collection.find_one({"email": email})
+        return find_by_email(self.collection, email)
 
-    def check_password(self, stored_password, provided_password):
-        """Check if the provided password matches the stored hashed password."""
-        return check_password_hash(stored_password, provided_password)
+    def check_password(self, user, provided_password):
+        """Check the provided password against the stored hash, upgrading the hash if it is outdated."""
+        matches, new_hash = verify_password(user["password"], provided_password)
+        if new_hash:
+            self.collection.update_one(
+                {"_id": user["_id"], "password": user["password"]}, {"$set": {"password": new_hash}}
+            )
+        return matches
@@ -1,21 +1,25 @@
-from werkzeug.security import generate_password_hash
+from pymongo import ASCENDING, IndexModel
 from flask_pymongo import PyMongo
+from passwords import hash_password
+from utils import EMAIL_COLLATION, EMAIL_INDEX, find_by_email, insert_account
 
 class UserModel:
+    # Emails are unique regardless of case; signup relies on the index to reject duplicates
+    INDEXES = [IndexModel([("email", ASCENDING)], name=EMAIL_INDEX, unique=True, collation=EMAIL_COLLATION)]
+
     def __init__(self, db):
         self.collection = db.signup
 
     def is_email_registered(self, email):
         """Check if the email is already registered."""
-        return self.collection.find_one({"email": email})
+        return find_by_email(self.collection, email)
 
     def create_user(self, name, email, password):
-        """Insert a new user into the database."""
-        hashed_password = generate_password_hash(password)
+        """Insert a new user; return False if the email is already registered (in any case)."""
+        hashed_password = hash_password(password)
         user_data = {
             "name": name,
             "email": email,
             "password": hashed_password
         }
-        self.collection.insert_one(user_data)
-        return True
+        return insert_account(self.collection, user_data)
@@ -0,0 +1,78 @@
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+from config import Config
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_QUEUE_SIZE)
+
+
+class HashingBusy(Exception):
+    """All PASSWORD_HASH_QUEUE_SIZE hashing slots are taken."""
+
+
+@functools.lru_cache(maxsize=None)
+def _method_prefix(method):
+    """The method part werkzeug writes for `method`, defaults included ("scrypt" -> "scrypt:32768:8:1")."""
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(stored_password, provided_password, method):
+    """Check a password; if it matches but was hashed with other parameters, also return a new hash."""
+    if not check_password_hash(stored_password, provided_password):
+        return False, None
+    if stored_password.split("$", 1)[0] == _method_prefix(method):
+        return True, None
+    return True, generate_password_hash(provided_password, method=method)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS)
+        return _executor
+
+
+def _run(fn, *args):
+    """Run `fn` in the hashing pool and wait for it, or raise HashingBusy if the pool is saturated.
+
+    Hashing is deliberately slow CPU work; keeping it out of the request
+    threads and capping how much can queue up means a burst of logins
+    fails fast instead of starving catalog requests.
+    """
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        if not Config.PASSWORD_HASH_WORKERS:
+            return fn(*args)
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    return _run(_hash, password, Config.PASSWORD_HASH_METHOD)
+
+
+def verify_password(stored_password, provided_password):
+    """Return `(matches, new_hash)`; `new_hash` is set when the stored hash should be upgraded."""
+    return _run(_verify, stored_password, provided_password, Config.PASSWORD_HASH_METHOD)
+
+
+def init_password_hashing(app):
+    """Answer requests that found the hashing pool saturated with 503."""
+
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(e):
+        response = jsonify({"error": "Too many sign-in requests, please try again shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
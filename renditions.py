@@ -0,0 +1,213 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from flask import abort, jsonify, request, send_file, send_from_directory
+from werkzeug.security import safe_join
+from config import Config
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow ?w=/?q= are ignored and originals served
+    Image = None
+
+# Output formats in order of preference, as (mimetype, Pillow format, extension)
+RENDITION_FORMATS = (
+    ("image/avif", "AVIF", "avif"),
+    ("image/webp", "WEBP", "webp"),
+    ("image/jpeg", "JPEG", "jpg"),
+)
+
+
+class DiskLRUCache:
+    """Size-bounded directory of files, evicting the least recently used first.
+
+    The index is rebuilt from the directory on startup (ordered by mtime), so
+    renditions survive restarts. Hits bump the file's mtime, which keeps that
+    order meaningful across processes sharing the folder.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+        entries = []
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path) and not name.endswith(".part"):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._bytes += size
+
+    def get(self, name):
+        """Return the path of cached file `name`, or None if it is not cached."""
+        path = os.path.join(self.folder, name)
+        with self._lock:
+            if name not in self._index:
+                # Possibly written by another worker process
+                if not os.path.isfile(path):
+                    return None
+                self._index[name] = os.path.getsize(path)
+                self._bytes += self._index[name]
+            self._index.move_to_end(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # evicted by another process
+            with self._lock:
+                self._bytes -= self._index.pop(name, 0)
+            return None
+        return path
+
+    def put(self, name, data):
+        """Store `data` bytes as `name` and evict old files until under max_bytes."""
+        path = os.path.join(self.folder, name)
+        fd, partial = tempfile.mkstemp(dir=self.folder, suffix=".part")
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.replace(partial, path)
+
+        with self._lock:
+            self._bytes += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            while self._bytes > self.max_bytes and len(self._index) > 1:
+                old, size = self._index.popitem(last=False)
+                self._bytes -= size
+                try:
+                    os.unlink(os.path.join(self.folder, old))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._index), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+rendition_cache = DiskLRUCache(Config.RESIZE_CACHE_FOLDER, Config.RESIZE_CACHE_BYTES)
+
+# Renditions currently being rendered, so concurrent misses wait for one render
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def available_formats():
+    """RENDITION_FORMATS restricted to the encoders this Pillow build has."""
+    Image.init()
+    return [f for f in RENDITION_FORMATS if f[1] in Image.SAVE]
+
+
+def negotiate_format():
+    """Pick the best format the client explicitly accepts; JPEG otherwise.
+
+    Only explicitly listed types count: a bare `*/*` would otherwise select
+    AVIF for clients that cannot decode it.
+    """
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    formats = available_formats()
+    for fmt in formats:
+        if fmt[0] in accepted:
+            return fmt
+    return formats[-1]
+
+
+def parse_resize_args(args):
+    """Read `w` (target width) and `q` (quality) from the query string."""
+    try:
+        width = int(args.get("w")) if args.get("w") else None
+        quality = int(args.get("q")) if args.get("q") else Config.RESIZE_DEFAULT_QUALITY
+    except ValueError:
+        raise ValueError("w and q must be integers")
+    if width is not None and not 1 <= width <= Config.RESIZE_MAX_WIDTH:
+        raise ValueError(f"w must be between 1 and {Config.RESIZE_MAX_WIDTH}")
+    if not 1 <= quality <= 100:
+        raise ValueError("q must be between 1 and 100")
+    return width, quality
+
+
+def render(source, width, quality, fmt):
+    """Decode `source`, scale it down to `width` and encode it as `fmt`."""
+    _, pillow_format, _ = fmt
+    with Image.open(source) as image:
+        if width is None or width > image.width:
+            width = image.width
+        height = max(1, round(image.height * width / image.width))
+        # Lets the JPEG decoder downscale while decoding (DCT scaling)
+        image.draft("RGB", (width, height))
+        if pillow_format == "JPEG":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        resized = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+    out = io.BytesIO()
+    resized.save(out, pillow_format, quality=quality)
+    return out.getvalue()
+
+
+def get_rendition(source, width, quality, fmt):
+    """Return the cached rendition path for these parameters, rendering it on a miss.
+
+    Concurrent misses for the same key share one render: the first caller
+    renders while the others wait on its result.
+    """
+    stat = os.stat(source)
+    digest = hashlib.sha1(f"{source}:{stat.st_mtime_ns}:{width}:{quality}:{fmt[2]}".encode()).hexdigest()
+    name = f"{digest}.{fmt[2]}"
+
+    path = rendition_cache.get(name)
+    if path:
+        return path
+
+    with _inflight_lock:
+        pending = _inflight.get(name)
+        owner = pending is None
+        if owner:
+            pending = _inflight[name] = Future()
+    if not owner:
+        return pending.result()
+
+    try:
+        path = rendition_cache.put(name, render(source, width, quality, fmt))
+        pending.set_result(path)
+        return path
+    except Exception as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            del _inflight[name]
+
+
+def send_image(folder, filename, **kwargs):
+    """send_from_directory, plus an on-the-fly resized rendition for ?w= / ?q=."""
+    if Image is None or not ("w" in request.args or "q" in request.args):
+        return send_from_directory(folder, filename, **kwargs)
+
+    try:
+        width, quality = parse_resize_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    source = safe_join(folder, filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+
+    fmt = negotiate_format()
+    try:
+        path = get_rendition(source, width, quality, fmt)
+    except Exception as e:
+        print(f"Error rendering {filename}: {e}")
+        return jsonify({"message": "Image could not be resized"}), 415
+
+    response = send_file(path, mimetype=fmt[0], **kwargs)
+    response.vary.add("Accept")
+    return response
@@ -0,0 +1,244 @@
+import base64
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from werkzeug.datastructures import FileStorage
+from config import Config
+from storage import MEDIA_FOLDER, SIGNATURE_LENGTH, StagedUpload
+
+# Resumable upload sessions: <id>.data holds the bytes, <id>.json the received ranges.
+# They sit on the media filesystem so a finished upload is renamed into place.
+SESSIONS_FOLDER = os.path.join(MEDIA_FOLDER, 'sessions')
+
+os.makedirs(SESSIONS_FOLDER, exist_ok=True)
+
+SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_last_gc = 0.0
+_gc_lock = threading.Lock()
+
+
+def _paths(upload_id):
+    if not SESSION_ID.match(upload_id or ""):
+        raise KeyError(upload_id)
+    base = os.path.join(SESSIONS_FOLDER, upload_id)
+    return base + ".data", base + ".json"
+
+
+@contextmanager
+def _locked_session(upload_id):
+    """Yield the session metadata under an exclusive file lock and save it afterwards.
+
+    The lock is a flock on the metadata file, so it also serializes PATCHes
+    handled by different worker processes.
+    """
+    _, meta_path = _paths(upload_id)
+    try:
+        f = open(meta_path, "r+")
+    except FileNotFoundError:
+        raise KeyError(upload_id)
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        meta = json.load(f)
+        yield meta
+        f.seek(0)
+        f.truncate()
+        json.dump(meta, f)
+
+
+def merge_ranges(ranges):
+    """Sort and coalesce [start, end) ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def received_offset(meta):
+    """Length of the contiguous prefix received so far (the tus Upload-Offset)."""
+    ranges = meta["ranges"]
+    return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+
+def is_complete(meta):
+    return received_offset(meta) == meta["length"]
+
+
+def parse_metadata(header):
+    """Decode a tus Upload-Metadata header ("key base64value, ...") into a dict."""
+    metadata = {}
+    for pair in (header or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if key:
+            metadata[key] = base64.b64decode(value).decode() if value else ""
+    return metadata
+
+
+def create_session(length, filename):
+    """Start a session for a file of `length` bytes and return its id."""
+    if not 0 < length <= Config.MAX_CONTENT_LENGTH:
+        raise ValueError("Invalid upload length")
+    if '.' not in filename:
+        raise ValueError("filename needs an extension")
+    collect_stale_sessions()
+
+    upload_id = uuid.uuid4().hex
+    data_path, meta_path = _paths(upload_id)
+    with open(data_path, "wb") as f:
+        f.truncate(length)
+    with open(meta_path, "w") as f:
+        json.dump({"length": length, "filename": filename, "ranges": [], "created_at": time.time()}, f)
+    return upload_id
+
+
+def get_session(upload_id):
+    _, meta_path = _paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            return json.load(f)
+    except FileNotFoundError:
+        raise KeyError(upload_id)
+
+
+def write_chunk(upload_id, offset, stream):
+    """Write the bytes of `stream` at `offset` and return the updated metadata.
+
+    Chunks may arrive out of order or in parallel; each one is written with
+    pwrite at its own offset. Whatever was written before a dropped
+    connection is still recorded, so the client only re-sends what is missing.
+    """
+    meta = get_session(upload_id)
+    if not 0 <= offset <= meta["length"]:
+        raise ValueError("Upload-Offset is outside the upload")
+
+    data_path, _ = _paths(upload_id)
+    fd = os.open(data_path, os.O_WRONLY)
+    position = offset
+    try:
+        while True:
+            chunk = stream.read(Config.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if position + len(chunk) > meta["length"]:
+                raise ValueError("Chunk extends past Upload-Length")
+            os.pwrite(fd, chunk, position)
+            position += len(chunk)
+    finally:
+        os.close(fd)
+        with _locked_session(upload_id) as meta:
+            if position > offset:
+                meta["ranges"] = merge_ranges(meta["ranges"] + [[offset, position]])
+                meta.pop("sha256", None)
+    return meta
+
+
+def delete_session(upload_id):
+    for path in _paths(upload_id):
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+class SessionUpload(StagedUpload):
+    """A completed session presented like a spooled multipart file.
+
+    store_upload claims it by renaming the data file into media/. Only once
+    that succeeded is the session ended; if the request fails at any point
+    before, the session is kept and the same upload_id can be submitted again.
+    """
+
+    def __init__(self, upload_id, meta):
+        self.path, self.meta_path = _paths(upload_id)
+        self._file = open(self.path, "rb")
+        self._head = self._file.read(SIGNATURE_LENGTH)
+        self._file.seek(0)
+        self.size = meta["length"]
+        self.digest = meta["sha256"]
+        self.rejected = False
+        self.claimed = False
+
+    def claim(self):
+        self._file.close()
+        self.claimed = True
+        return self.path, self.digest, self.size
+
+    def stored(self):
+        if os.path.exists(self.meta_path):
+            os.unlink(self.meta_path)
+
+    def unclaim(self):
+        # Keep the session (and its data) for another attempt
+        self.claimed = False
+
+    def close(self):
+        self._file.close()
+
+
+def open_upload(upload_id):
+    """Return a completed session as a FileStorage for the create/update routes.
+
+    Raises ValueError for unknown or incomplete sessions. The SHA-256 is
+    computed once per completed session and remembered in its metadata.
+    """
+    try:
+        with _locked_session(upload_id) as meta:
+            if not is_complete(meta):
+                raise ValueError("Upload is incomplete")
+            if "sha256" not in meta:
+                sha256 = hashlib.sha256()
+                with open(_paths(upload_id)[0], "rb") as f:
+                    for chunk in iter(lambda: f.read(Config.UPLOAD_CHUNK_SIZE), b""):
+                        sha256.update(chunk)
+                meta["sha256"] = sha256.hexdigest()
+    except KeyError:
+        raise ValueError("Unknown upload_id")
+    return FileStorage(stream=SessionUpload(upload_id, meta), filename=meta["filename"], name="image")
+
+
+def collect_stale_sessions(force=False):
+    """Delete sessions untouched for UPLOAD_SESSION_TTL seconds; return how many.
+
+    Called from create_session at most once per UPLOAD_SESSION_GC_INTERVAL
+    per process, and on demand by `flask gc-upload-sessions`.
+    """
+    global _last_gc
+    with _gc_lock:
+        now = time.time()
+        if not force and now - _last_gc < Config.UPLOAD_SESSION_GC_INTERVAL:
+            return 0
+        _last_gc = now
+
+    removed = 0
+    for name in os.listdir(SESSIONS_FOLDER):
+        upload_id, ext = os.path.splitext(name)
+        if ext != ".data" or not SESSION_ID.match(upload_id):
+            continue
+        data_path, meta_path = _paths(upload_id)
+        try:
+            touched = max(os.path.getmtime(p) for p in (data_path, meta_path) if os.path.exists(p))
+        except (OSError, ValueError):
+            continue
+        if now - touched > Config.UPLOAD_SESSION_TTL:
+            delete_session(upload_id)
+            removed += 1
+    return removed
+
+
+def uploaded_image(request):
+    """The image of a create/update request: the `image` file part, or the
+    completed resumable upload named by the `upload_id` form field. None if
+    neither was sent.
+    """
+    if "image" in request.files:
+        return request.files["image"]
+    upload_id = request.form.get("upload_id")
+    return open_upload(upload_id) if upload_id else None
@@ -0,0 +1,77 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from flask import request
+from pymongo import monitoring
+from config import Config
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """pymongo command listener counting the commands sent to MongoDB.
+
+    Every command is one round trip. Counts are kept per thread, so the
+    count of the current request can be read, and in total per command name.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.commands = Counter()
+
+    def started(self, event):
+        self._local.count = getattr(self._local, "count", 0) + 1
+        log = getattr(self._local, "log", None)
+        if log is not None:
+            log.append((event.command_name, event.command.get(event.command_name)))
+        with self._lock:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self._local.count = 0
+
+    def count(self):
+        """Round trips made by this thread since the last reset."""
+        return getattr(self._local, "count", 0)
+
+    @contextmanager
+    def recording(self):
+        """Collect `(command name, collection)` for every command this thread sends inside the block."""
+        self._local.log = log = []
+        try:
+            yield log
+        finally:
+            self._local.log = None
+
+    def stats(self):
+        with self._lock:
+            return {"total": sum(self.commands.values()), "commands": dict(self.commands)}
+
+
+round_trips = RoundTripCounter()
+
+
+def init_round_trips(app):
+    """Send an X-DB-Round-Trips header with every response when DB_ROUND_TRIP_HEADER is set.
+
+    `round_trips` has to be passed to the MongoClient as an event listener.
+    Work done after the response is returned (streamed bodies, background
+    threads) is not included.
+    """
+    if not Config.DB_ROUND_TRIP_HEADER:
+        return
+
+    @app.before_request
+    def reset_round_trips():
+        round_trips.reset()
+
+    @app.after_request
+    def add_round_trip_header(response):
+        if request.method != "OPTIONS":
+            response.headers["X-DB-Round-Trips"] = str(round_trips.count())
+        return response
@@ -1,22 +1,21 @@
-import jwt
-import datetime
 from flask import Blueprint, request, jsonify
 import re
 from models.admin_login_model import AdminModel
+from auth import bearer_token, issue_admin_token, revoke_admin_tokens, verify_admin_token
 
 # Blueprint setup
 admin_bp = Blueprint("admin", __name__)
 
-# Directly define the SECRET_KEY here
-SECRET_KEY = "your-secret-key"  # Set your secret key here
-
 def setup_admin_routes(db):
     admin_model = AdminModel(db)
 
-    # Admin signup route
+    # Admin signup route: only an authenticated admin may add another one
     @admin_bp.route("/admin-signup", methods=["POST"])
     def admin_signup():
         """API endpoint to register a new admin."""
+        if verify_admin_token(db, bearer_token()) is None:
+            return jsonify({"error": "Admin authentication required"}), 401
+
         data = request.get_json()
 
         # Extract data from request
@@ -31,12 +30,9 @@ def setup_admin_routes(db):
         if not re.match(r"[^@]+@[^@]+\.[^@]+", email):  # Validate email format
             return jsonify({"error": "Invalid email address"}), 400
 
-        # Check for duplicate email
-        if admin_model.is_email_registered(email):
+        # Create new admin; the unique email index rejects duplicates in the same round trip
+        if not admin_model.create_admin(name, email, password):
             return jsonify({"error": "Email already registered"}), 400
-
-        # Create new admin
-        admin_model.create_admin(name, email, password)
         return jsonify({"message": "Admin registered successfully"}), 201
 
     # Admin login route
@@ -58,16 +54,23 @@ def setup_admin_routes(db):
 
         # Check if admin exists and password matches
         admin = admin_model.get_admin_by_email(email)
-        if not admin or not admin_model.check_password(admin["password"], password):
+        if not admin or not admin_model.check_password(admin, password):
             return jsonify({"error": "Invalid email or password"}), 401
 
-        # Generate JWT token
-        payload = {
-            "admin_id": str(admin["_id"]),
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(hours=1)  # Token expires in 1 hour
-        }
-        token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+        # Generate JWT token (expires after Config.ADMIN_TOKEN_TTL)
+        token = issue_admin_token(admin["_id"])
 
         return jsonify({"message": "Admin login successful", "token": token}), 200
 
+    # Admin logout route: revokes every token of the calling admin
+    @admin_bp.route("/admin-logout", methods=["POST"])
+    def admin_logout():
+        """API endpoint to log an admin out everywhere."""
+        claims = verify_admin_token(db, bearer_token())
+        if claims is None:
+            return jsonify({"error": "Invalid or expired token"}), 401
+
+        revoke_admin_tokens(db, claims["admin_id"])
+        return jsonify({"message": "Admin logged out"}), 200
+
     return admin_bp
@@ -0,0 +1,181 @@
+from flask import Blueprint, request, jsonify
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from config import Config
+from cache import invalidate_collection
+from catalog_io import IMPORT_TARGETS, parse_price
+from storage import release_uploads
+from utils import build_filter
+
+# Criteria a filtered bulk update accepts (the list filters plus explicit ids)
+FILTER_KEYS = ("min_price", "max_price", "name_prefix", "ids")
+
+# Fields a bulk update may change. Images go through the upload routes so
+# that media reference counts stay right.
+BULK_FIELDS = ("name", "price")
+
+
+def parse_changes(changes):
+    """Validate a `$set` document of a bulk update."""
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError("changes must be a non-empty object")
+    unknown = set(changes) - set(BULK_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot change {', '.join(sorted(unknown))}")
+    changes = dict(changes)
+    if "price" in changes:
+        changes["price"] = parse_price(changes["price"])
+    if "name" in changes and (not isinstance(changes["name"], str) or not changes["name"].strip()):
+        raise ValueError("Invalid name")
+    return changes
+
+
+def parse_ids(ids):
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("ids must be a non-empty list")
+    if len(ids) > Config.BULK_MAX_ITEMS:
+        raise ValueError(f"At most {Config.BULK_MAX_ITEMS} items per request")
+    return ids
+
+
+def update_items(db, collection, items):
+    """Apply per-item `{id, changes}` with one unordered bulk_write; return per-item results."""
+    results = [None] * len(parse_ids(items))
+    operations, oids, positions = [], [], []
+    for i, item in enumerate(items):
+        try:
+            oid = ObjectId(item["id"])
+            operations.append(UpdateOne({"_id": oid}, {"$set": parse_changes(item.get("changes"))}))
+            oids.append(oid)
+            positions.append(i)
+            results[i] = {"id": str(oid), "status": "updated"}
+        except (InvalidId, TypeError, KeyError):
+            results[i] = {"id": item.get("id") if isinstance(item, dict) else None, "status": "invalid", "error": "Invalid id"}
+        except ValueError as e:
+            results[i] = {"id": item.get("id"), "status": "invalid", "error": str(e)}
+    if not operations:
+        return results
+
+    try:
+        db[collection].bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            results[positions[error["index"]]].update(status="error", error=error.get("errmsg", "Write error"))
+
+    # bulk_write only reports totals, so find out which ids matched nothing
+    found = {doc["_id"] for doc in db[collection].find({"_id": {"$in": oids}}, {"_id": 1})}
+    for oid, i in zip(oids, positions):
+        if oid not in found:
+            results[i]["status"] = "not_found"
+    return results
+
+
+def update_matching(db, collection, criteria, set_fields, mul_fields):
+    """Apply `$set`/`$mul` to every document matching `criteria` with one update_many.
+
+    `criteria` must narrow the update down: unknown keys and an empty filter
+    are rejected rather than turned into a collection-wide update.
+    """
+    if not isinstance(criteria, dict):
+        raise ValueError("filter must be an object")
+    unknown = set(criteria) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unsupported filter: {', '.join(sorted(unknown))}")
+    query = build_filter({k: str(v) for k, v in criteria.items() if k != "ids"})
+    if "ids" in criteria:
+        try:
+            query["_id"] = {"$in": [ObjectId(i) for i in parse_ids(criteria["ids"])]}
+        except (InvalidId, TypeError):
+            raise ValueError("Invalid id in filter")
+    if not query:
+        # An empty query would rewrite the whole collection
+        raise ValueError(f"filter needs at least one of {', '.join(FILTER_KEYS)}")
+
+    update = {}
+    if set_fields:
+        update["$set"] = parse_changes(set_fields)
+    if mul_fields:
+        if not isinstance(mul_fields, dict) or set(mul_fields) != {"price"}:
+            raise ValueError("$mul only supports price")
+        update["$mul"] = {"price": parse_price(mul_fields["price"])}
+    if not update:
+        raise ValueError("Nothing to update: give $set or $mul")
+    if "price" in update.get("$set", {}) and "$mul" in update:
+        raise ValueError("price cannot be both set and multiplied")
+
+    result = db[collection].update_many(query, update)
+    return {"matched": result.matched_count, "modified": result.modified_count}
+
+
+def delete_items(db, collection, ids):
+    """Delete many documents with one delete_many and release their images together."""
+    results, oids = [], []
+    for value in parse_ids(ids):
+        try:
+            oids.append(ObjectId(value))
+            results.append({"id": str(oids[-1]), "status": "deleted"})
+        except (InvalidId, TypeError):
+            results.append({"id": value, "status": "invalid", "error": "Invalid id"})
+
+    docs = list(db[collection].find({"_id": {"$in": oids}}, {"image_url": 1}))
+    if docs:
+        db[collection].delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        release_uploads(db, [doc.get("image_url") for doc in docs])
+
+    found = {str(doc["_id"]) for doc in docs}
+    for result in results:
+        if result["status"] == "deleted" and result["id"] not in found:
+            result["status"] = "not_found"
+    return results
+
+
+# Blueprint factory
+def create_bulk_routes(db):
+    bulk_bp = Blueprint('bulk', __name__)
+
+    def bulk_update(collection):
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({"message": "Expected a JSON object"}), 400
+        try:
+            if "items" in payload:
+                response = {"results": update_items(db, collection, payload["items"])}
+            elif "filter" in payload:
+                response = update_matching(db, collection, payload["filter"], payload.get("$set"), payload.get("$mul"))
+            else:
+                return jsonify({"message": "Give either items or filter"}), 400
+            invalidate_collection(db, collection)
+            return jsonify(response), 200
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error updating {collection}: {str(e)}"}), 500
+
+    def bulk_delete(collection):
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({"message": "Expected a JSON object"}), 400
+        try:
+            results = delete_items(db, collection, payload.get("ids"))
+            invalidate_collection(db, collection)
+            return jsonify({"results": results}), 200
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error deleting {collection}: {str(e)}"}), 500
+
+    # Routes: PATCH/DELETE /api/<collection>/bulk. One static rule per collection,
+    # so they take precedence over the blueprints' /<collection>/<id> rules.
+    for collection in IMPORT_TARGETS:
+        bulk_bp.add_url_rule(
+            f"/{collection}/bulk", f"update_{collection}", bulk_update, methods=["PATCH"],
+            defaults={"collection": collection},
+        )
+        bulk_bp.add_url_rule(
+            f"/{collection}/bulk", f"delete_{collection}", bulk_delete, methods=["DELETE"],
+            defaults={"collection": collection},
+        )
+
+    return bulk_bp
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify
+from config import Config
+from cache import catalog_cache
+from utils import CATALOG_COLLECTIONS, catalog_list, list_cache_key, parse_page_args
+
+# Shared pool so that one storefront request queries every category at once
+catalog_executor = ThreadPoolExecutor(max_workers=Config.CATALOG_FETCH_WORKERS, thread_name_prefix="catalog")
+
+# Blueprint factory
+def create_catalog_routes(db):
+    catalog_bp = Blueprint('catalog', __name__)
+
+    # Route: First page of several categories in one response
+    @catalog_bp.route("/catalog", methods=["GET"])
+    def get_catalog():
+        categories = request.args.get("categories")
+        categories = [c.strip() for c in categories.split(",") if c.strip()] if categories else list(CATALOG_COLLECTIONS)
+        unknown = [c for c in categories if c not in CATALOG_COLLECTIONS]
+        if unknown:
+            return jsonify({"message": f"Unknown categories: {', '.join(unknown)}"}), 400
+
+        try:
+            page = parse_page_args({
+                "limit": request.args.get("limit") or str(Config.DEFAULT_PAGE_SIZE),
+                "sort": request.args.get("sort"),
+            })
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        def fetch(name):
+            key = list_cache_key(name, page, {})
+            return catalog_cache.get_or_load(key, lambda: catalog_list(db[name], page))
+
+        try:
+            futures = {name: catalog_executor.submit(fetch, name) for name in dict.fromkeys(categories)}
+            return jsonify({name: future.result() for name, future in futures.items()}), 200
+        except Exception as e:
+            return jsonify({"message": f"Error fetching catalog: {str(e)}"}), 500
+
+    return catalog_bp
@@ -1,7 +1,12 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
 import os
 from bson import ObjectId
+from bson.errors import InvalidId
+from utils import parse_page_args, stream_response, wants_stream
+from cache import conditional, invalidate_collection
+from storage import generate_media_url, is_image, release_upload, store_upload
+from thumbnails import schedule_variants
+from resumable import uploaded_image
 from models.combos_details_model import CombosDetailsModel  
 
 # Constants for file uploads
@@ -15,10 +20,6 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Utility function to generate the URL for the uploaded image
-def generate_image_url(filename, base_url):
-    return f"{base_url}uploads/combos_details/{filename}"
-
 # Blueprint factory
 def create_combos_details_routes(db):
     combos_details_bp = Blueprint('combos_details', __name__)
@@ -29,7 +30,10 @@ def create_combos_details_routes(db):
         try:
             name = request.form.get("name")
             price = request.form.get("price")
-            image = request.files.get("image")
+            try:
+                image = uploaded_image(request)  # file part, or a finished resumable upload
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
             combo_id = request.form.get("combo_id")  # Get the combo_id from the form
 
             if not all([name, price, image, combo_id]):
@@ -40,17 +44,12 @@ def create_combos_details_routes(db):
             if not combo:
                 return jsonify({"message": "T-shirt not found"}), 404
 
-            if not allowed_file(image.filename):
+            if not allowed_file(image.filename) or not is_image(image):
                 return jsonify({"message": "Invalid image file type"}), 400
 
-            # Save the image
-            filename = secure_filename(image.filename)
-            image_path = os.path.join(UPLOAD_FOLDER, filename)
-            image.save(image_path)
-
-            # Generate image URL
-            base_url = request.host_url
-            image_url = generate_image_url(filename, base_url)
+            # Store the image once under its content hash
+            image_path = store_upload(db, image)
+            image_url = generate_media_url(image_path, request.host_url)
 
             # Remove commas from price and convert to float
             try:
@@ -63,6 +62,8 @@ def create_combos_details_routes(db):
             combo_detail_id = combos_details_model.create_item(name, price, image_url, combo_id)
 
             if combo_detail_id:
+                invalidate_collection(db, "combos_details", combo_detail_id)
+                schedule_variants(db, "combos_details", ObjectId(combo_detail_id), image_path, request.host_url)
                 return jsonify({"combo_detail_id": combo_detail_id, "name": name, "price": price, "image_url": image_url}), 201
             return jsonify({"message": "Error creating combos_details"}), 500
         except Exception as e:
@@ -70,16 +71,28 @@ def create_combos_details_routes(db):
 
     # Route: Get all combos_details
     @combos_details_bp.route("/combos_details", methods=["GET"])
+    @conditional(db, "combos_details")
     def get_all_combos_details():
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        if page["limit"] is None and wants_stream():
+            return stream_response(CombosDetailsModel(db).iter_items(sort=page["sort"]))
+
         try:
             combos_details_model = CombosDetailsModel (db)
-            combos_details = combos_details_model.get_all_items()
-            return jsonify(combos_details), 200
+            combos_details, next_cursor = combos_details_model.get_all_items(**page)
+            if page["limit"] is None:
+                return jsonify(combos_details), 200
+            return jsonify({"items": combos_details, "next": next_cursor}), 200
         except Exception as e:
             return jsonify({"message": f"Error fetching combos_details: {str(e)}"}), 500
 
     # Route: Get combos_details by ID
     @combos_details_bp.route("/combos_details/<combo_detail_id>", methods=["GET"])
+    @conditional(db, "combos_details")
     def get_combos_details_by_id(combo_detail_id):
         try:
             combos_details_model = CombosDetailsModel (db)
@@ -90,16 +103,40 @@ def create_combos_details_routes(db):
         except Exception as e:
             return jsonify({"message": f"Error fetching combos_details: {str(e)}"}), 500
 
+    # Route: Get a combo with all its details in one request (?limit/&after paginate the details)
+    @combos_details_bp.route("/combos/<combo_id>/full", methods=["GET"])
+    @conditional(db, ("combos", "combos_details"))
+    def get_combo_full(combo_id):
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        if page["sort"] is not None:
+            return jsonify({"message": "Details are returned in creation order"}), 400
+
+        try:
+            combo = CombosDetailsModel(db).get_full(combo_id, limit=page["limit"], after=page["after"])
+        except InvalidId:
+            combo = None
+        except Exception as e:
+            return jsonify({"message": f"Error fetching combo: {str(e)}"}), 500
+        if not combo:
+            return jsonify({"message": "Combo not found"}), 404
+        return jsonify(combo), 200
+
     # Route: Update a combos_details
     @combos_details_bp.route("/combos_details/<combo_detail_id>", methods=["PUT"])
     def update_combos_details(combo_detail_id):
         try:
-            combos_details_model = CombosDetailsModel (db)
-            combos_details = combos_details_model.get_item_by_id(combo_detail_id)
-            if not combos_details:
+            if not ObjectId.is_valid(combo_detail_id):
                 return jsonify({"message": "T-shirts details not found"}), 404
 
             updated_data = request.form.to_dict()
+            updated_data.pop("upload_id", None)
+            try:
+                image = uploaded_image(request)
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
 
             # Get and validate combo_id from the form data
             combo_id = updated_data.get("combo_id")
@@ -116,23 +153,31 @@ def create_combos_details_routes(db):
                     return jsonify({"message": "Invalid price format"}), 400
 
             # Update image if present
-            if "image" in request.files:
-                image = request.files["image"]
-                if not allowed_file(image.filename):
+            if image is not None:
+                if not allowed_file(image.filename) or not is_image(image):
                     return jsonify({"message": "Invalid image file type"}), 400
 
-                filename = secure_filename(image.filename)
-                image_path = os.path.join(UPLOAD_FOLDER, filename)
-                image.save(image_path)
-                base_url = request.host_url
-                updated_data["image_url"] = generate_image_url(filename, base_url)
-
-            # Update in database
-            success = combos_details_model.update_item(combo_detail_id, updated_data)
-            if success:
-                updated_combos_details = combos_details_model.get_item_by_id(combo_detail_id)
-                return jsonify(updated_combos_details), 200
-            return jsonify({"message": "Error updating combos_details"}), 500
+                image_path = store_upload(db, image)
+                updated_data["image_url"] = generate_media_url(image_path, request.host_url)
+                updated_data["image_variants"] = {}
+
+            if not updated_data:
+                return jsonify({"message": "Nothing to update"}), 400
+
+            # Update in database: one round trip, which also returns the image being replaced
+            result = CombosDetailsModel(db).update_item(combo_detail_id, updated_data)
+            combos_details, previous_image = result or (None, None)
+            if not combos_details:
+                if image is not None:
+                    release_upload(db, updated_data["image_url"])
+                if result:
+                    return jsonify({"message": "T-shirts details not found"}), 404
+                return jsonify({"message": "Error updating combos_details"}), 500
+            invalidate_collection(db, "combos_details", combo_detail_id)
+            if image is not None:
+                release_upload(db, previous_image)
+                schedule_variants(db, "combos_details", ObjectId(combo_detail_id), image_path, request.host_url)
+            return jsonify(combos_details), 200
         except Exception as e:
             return jsonify({"message": f"Error updating combos_details: {str(e)}"}), 500
 
@@ -140,15 +185,18 @@ def create_combos_details_routes(db):
     @combos_details_bp.route("/combos_details/<combo_detail_id>", methods=["DELETE"])
     def delete_combos_details(combo_detail_id):
         try:
-            combos_details_model = CombosDetailsModel (db)
-            combos_details = combos_details_model.get_item_by_id(combo_detail_id)
-            if not combos_details:
+            if not ObjectId.is_valid(combo_detail_id):
                 return jsonify({"message": "T-shirts details not found"}), 404
 
-            success = combos_details_model.delete_item(combo_detail_id)
-            if success:
-                return jsonify({"message": "T-shirts details deleted successfully"}), 200
-            return jsonify({"message": "Error deleting combos_details"}), 500
+            # One round trip, which also returns the image to release
+            deleted = CombosDetailsModel(db).delete_item(combo_detail_id)
+            if deleted is None:
+                return jsonify({"message": "T-shirts details not found"}), 404
+            if not deleted:
+                return jsonify({"message": "Error deleting combos_details"}), 500
+            invalidate_collection(db, "combos_details", combo_detail_id)
+            release_upload(db, deleted.get("image_url"))
+            return jsonify({"message": "T-shirts details deleted successfully"}), 200
         except Exception as e:
             return jsonify({"message": f"Error deleting combos_details: {str(e)}"}), 500
 
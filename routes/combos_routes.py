@@ -1,7 +1,12 @@
-from flask import Blueprint, request, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Blueprint, request, jsonify
 import os
 from bson import ObjectId
+from utils import CATALOG_PROJECTION, build_filter, catalog_list, list_cache_key, parse_page_args, set_fields, stream_response, wants_stream
+from models.combos_model import CombosModel
+from cache import catalog_cache, conditional, invalidate_collection
+from storage import generate_media_url, is_image, release_upload, store_upload
+from thumbnails import schedule_variants
+from resumable import uploaded_image
 
 # Constants
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../uploads/combos/')
@@ -14,10 +19,6 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Utility function to generate the URL for the uploaded image
-def generate_image_url(filename, base_url):
-    return f"{base_url}uploads/combos/{filename}"
-
 # Blueprint factory
 def create_combos_routes(db):
     combos_bp = Blueprint('combos', __name__)
@@ -28,7 +29,10 @@ def create_combos_routes(db):
         try:
             name = request.form.get("name")
             price = request.form.get("price")
-            image = request.files.get("image")
+            try:
+                image = uploaded_image(request)  # file part, or a finished resumable upload
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
 
             if not all([name, price, image]):
                 return jsonify({"message": "Missing required fields"}), 400
@@ -38,22 +42,19 @@ def create_combos_routes(db):
             except ValueError:
                 return jsonify({"message": "Invalid price format"}), 400
 
-            if not allowed_file(image.filename):
+            if not allowed_file(image.filename) or not is_image(image):
                 return jsonify({"message": "Invalid image file type"}), 400
 
-            # Save the image
-            filename = secure_filename(image.filename)
-            image_path = os.path.join(UPLOAD_FOLDER, filename)
-            image.save(image_path)
-
-            # Generate image URL
-            base_url = request.host_url
-            image_url = generate_image_url(filename, base_url)
+            # Store the image once under its content hash
+            image_path = store_upload(db, image)
+            image_url = generate_media_url(image_path, request.host_url)
 
             # Insert into database
             combo_data = {"name": name, "price": price, "image_url": image_url}
             result = db.combos.insert_one(combo_data)
             combo_data["_id"] = str(result.inserted_id)
+            invalidate_collection(db, "combos", combo_data["_id"])
+            schedule_variants(db, "combos", result.inserted_id, image_path, request.host_url)
 
             return jsonify(combo_data), 201
         except Exception as e:
@@ -61,26 +62,35 @@ def create_combos_routes(db):
 
     # Route: Fetch all combos
     @combos_bp.route("/combos", methods=["GET"])
+    @conditional(db, "combos")
     def get_all_combos():
         try:
-            combos = db.combos.find({}, {"name": 1, "price": 1, "image_url": 1})
-            combos_list = [
-                {"_id": str(h["_id"]), "name": h["name"], "price": h["price"], "image_url": h["image_url"]}
-                for h in combos
-            ]
-            return jsonify(combos_list), 200
+            page = parse_page_args(request.args)
+            query = build_filter(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        if page["limit"] is None and wants_stream():
+            return stream_response(CombosModel(db).iter_items(query, page["sort"]))
+
+        try:
+            key = list_cache_key("combos", page, query)
+            return jsonify(catalog_cache.get_or_load(key, lambda: catalog_list(db.combos, page, query))), 200
         except Exception as e:
             return jsonify({"message": f"Error fetching combos: {str(e)}"}), 500
 
     # Route: Fetch combo by ID
     @combos_bp.route("/combos/<id>", methods=["GET"])
+    @conditional(db, "combos")
     def get_combo_by_id(id):
+        def load():
+            return db.combos.find_one({"_id": ObjectId(id)}, CATALOG_PROJECTION)
+
         try:
-            combo = db.combos.find_one({"_id": ObjectId(id)}, {"name": 1, "price": 1, "image_url": 1})
-            if not combo :
+            combo = catalog_cache.get_or_load(("combos", "item", str(ObjectId(id))), load)
+            if not combo:
                 return jsonify({"message": "Combos not found"}), 404
-            combo ["_id"] = str(combo ["_id"])
-            return jsonify(combo ), 200
+            return jsonify(combo), 200
         except Exception as e:
             return jsonify({"message": f"Error fetching combo: {str(e)}"}), 500
 
@@ -88,30 +98,39 @@ def create_combos_routes(db):
     @combos_bp.route("/combos/<id>", methods=["PUT"])
     def update_combos(id):
         try:
-            combo  = db.combos.find_one({"_id": ObjectId(id)})
-            if not combo :
-                return jsonify({"message": "Combos not found"}), 404
+            item_id = ObjectId(id)
 
             updated_data = request.form.to_dict()
+            updated_data.pop("upload_id", None)
+            try:
+                image = uploaded_image(request)
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
             if "price" in updated_data:
                 updated_data["price"] = float(updated_data["price"].replace(",", ""))
 
-            if "image" in request.files:
-                image = request.files["image"]
-                if not allowed_file(image.filename):
+            if image is not None:
+                if not allowed_file(image.filename) or not is_image(image):
                     return jsonify({"message": "Invalid image file type"}), 400
 
-                filename = secure_filename(image.filename)
-                image_path = os.path.join(UPLOAD_FOLDER, filename)
-                image.save(image_path)
-                base_url = request.host_url
-                updated_data["image_url"] = generate_image_url(filename, base_url)
+                image_path = store_upload(db, image)
+                updated_data["image_url"] = generate_media_url(image_path, request.host_url)
+                updated_data["image_variants"] = {}
 
-            db.combos.update_one({"_id": ObjectId(id)}, {"$set": updated_data})
-            updated_combo = db.combos.find_one({"_id": ObjectId(id)}, {"name": 1, "price": 1, "image_url": 1})
-            updated_combo["_id"] = str(updated_combo["_id"])
+            if not updated_data:
+                return jsonify({"message": "Nothing to update"}), 400
 
-            return jsonify(updated_combo), 200
+            # One round trip, which also returns the image being replaced
+            combo, previous_image = set_fields(db.combos, item_id, updated_data)
+            if not combo:
+                if image is not None:
+                    release_upload(db, updated_data["image_url"])
+                return jsonify({"message": "Combos not found"}), 404
+            invalidate_collection(db, "combos", str(item_id))
+            if image is not None:
+                release_upload(db, previous_image)
+                schedule_variants(db, "combos", item_id, image_path, request.host_url)
+            return jsonify(combo), 200
         except Exception as e:
             return jsonify({"message": f"Error updating combo: {str(e)}"}), 500
 
@@ -119,20 +138,13 @@ def create_combos_routes(db):
     @combos_bp.route("/combos/<id>", methods=["DELETE"])
     def delete_combo(id):
         try:
-            result = db.combos.delete_one({"_id": ObjectId(id)})
-            if result.deleted_count == 0:
+            combo = db.combos.find_one_and_delete({"_id": ObjectId(id)}, projection={"image_url": 1})
+            if not combo:
                 return jsonify({"message": "Combo not found"}), 404
+            invalidate_collection(db, "combos", str(ObjectId(id)))
+            release_upload(db, combo.get("image_url"))
             return jsonify({"message": "Combo deleted successfully"}), 200
         except Exception as e:
             return jsonify({"message": f"Error deleting combo: {str(e)}"}), 500
 
-    @combos_bp.route("/uploads/combos/<filename>")
-    def serve_image(filename):
-        try:
-            return send_from_directory(UPLOAD_FOLDER, filename)
-        except FileNotFoundError:
-            return jsonify({"message": "File not found"}), 404
-
-
-
     return combos_bp
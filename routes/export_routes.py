@@ -0,0 +1,37 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from catalog_io import EXPORT_FORMATS, IMPORT_TARGETS, export_chunks, gzip_chunks, parse_id_range
+
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+# Blueprint factory
+def create_export_routes(db):
+    export_bp = Blueprint('export', __name__)
+
+    # Route: Stream a whole collection (?format=ndjson|csv|parquet&after=<id>&until=<id>&partitions=N)
+    @export_bp.route("/export/<collection>", methods=["GET"])
+    def export_collection(collection):
+        if collection not in IMPORT_TARGETS:
+            return jsonify({"message": f"collection must be one of {', '.join(IMPORT_TARGETS)}"}), 400
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"message": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+        try:
+            query = parse_id_range(request.args.get("after"), request.args.get("until"))
+            partitions = max(1, min(request.args.get("partitions", 1, type=int), 16))
+            chunks = export_chunks(db, collection, fmt, query, partitions)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        # Resume an interrupted export with ?after=<last _id received>
+        # Streamed exports are only ever gzipped, so ask for gzip itself (not just any encoding)
+        gzip = fmt != "parquet" and request.accept_encodings["gzip"] > 0
+        response = Response(stream_with_context(gzip_chunks(chunks) if gzip else chunks), mimetype=EXPORT_MIMETYPES[fmt])
+        if gzip:
+            response.headers["Content-Encoding"] = "gzip"
+        response.vary.add("Accept-Encoding")
+        response.headers["Content-Disposition"] = f"attachment; filename={collection}.{fmt}"
+        return response
+
+    return export_bp
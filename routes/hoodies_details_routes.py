@@ -1,7 +1,12 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
 import os
 from bson import ObjectId
+from bson.errors import InvalidId
+from utils import parse_page_args, stream_response, wants_stream
+from cache import conditional, invalidate_collection
+from storage import generate_media_url, is_image, release_upload, store_upload
+from thumbnails import schedule_variants
+from resumable import uploaded_image
 from models.hoodies_details_models import HoodiesDetailsModel  
 
 # Constants for file uploads
@@ -15,10 +20,6 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Utility function to generate the URL for the uploaded image
-def generate_image_url(filename, base_url):
-    return f"{base_url}uploads/hoodies_details/{filename}"
-
 # Blueprint factory
 def create_hoodies_details_routes(db):
     hoodies_details_bp = Blueprint('hoodies_details', __name__)
@@ -29,7 +30,10 @@ def create_hoodies_details_routes(db):
         try:
             name = request.form.get("name")
             price = request.form.get("price")
-            image = request.files.get("image")
+            try:
+                image = uploaded_image(request)  # file part, or a finished resumable upload
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
             hoodie_id = request.form.get("hoodie_id")  # Get the hoodie_id from the form
 
             if not all([name, price, image, hoodie_id]):
@@ -40,17 +44,12 @@ def create_hoodies_details_routes(db):
             if not hoodie:
                 return jsonify({"message": "T-shirt not found"}), 404
 
-            if not allowed_file(image.filename):
+            if not allowed_file(image.filename) or not is_image(image):
                 return jsonify({"message": "Invalid image file type"}), 400
 
-            # Save the image
-            filename = secure_filename(image.filename)
-            image_path = os.path.join(UPLOAD_FOLDER, filename)
-            image.save(image_path)
-
-            # Generate image URL
-            base_url = request.host_url
-            image_url = generate_image_url(filename, base_url)
+            # Store the image once under its content hash
+            image_path = store_upload(db, image)
+            image_url = generate_media_url(image_path, request.host_url)
 
             # Remove commas from price and convert to float
             try:
@@ -63,6 +62,8 @@ def create_hoodies_details_routes(db):
             hoodie_detail_id = hoodies_details_model.create_item(name, price, image_url, hoodie_id)
 
             if hoodie_detail_id:
+                invalidate_collection(db, "hoodies_details", hoodie_detail_id)
+                schedule_variants(db, "hoodies_details", ObjectId(hoodie_detail_id), image_path, request.host_url)
                 return jsonify({"hoodie_detail_id": hoodie_detail_id, "name": name, "price": price, "image_url": image_url}), 201
             return jsonify({"message": "Error creating hoodies_details"}), 500
         except Exception as e:
@@ -70,16 +71,28 @@ def create_hoodies_details_routes(db):
 
     # Route: Get all hoodies_details
     @hoodies_details_bp.route("/hoodies_details", methods=["GET"])
+    @conditional(db, "hoodies_details")
     def get_all_hoodies_details():
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        if page["limit"] is None and wants_stream():
+            return stream_response(HoodiesDetailsModel(db).iter_items(sort=page["sort"]))
+
         try:
             hoodies_details_model = HoodiesDetailsModel(db)
-            hoodies_details = hoodies_details_model.get_all_items()
-            return jsonify(hoodies_details), 200
+            hoodies_details, next_cursor = hoodies_details_model.get_all_items(**page)
+            if page["limit"] is None:
+                return jsonify(hoodies_details), 200
+            return jsonify({"items": hoodies_details, "next": next_cursor}), 200
         except Exception as e:
             return jsonify({"message": f"Error fetching hoodies_details: {str(e)}"}), 500
 
     # Route: Get hoodies_details by ID
     @hoodies_details_bp.route("/hoodies_details/<hoodie_detail_id>", methods=["GET"])
+    @conditional(db, "hoodies_details")
     def get_hoodies_details_by_id(hoodie_detail_id):
         try:
             hoodies_details_model = HoodiesDetailsModel(db)
@@ -90,16 +103,40 @@ def create_hoodies_details_routes(db):
         except Exception as e:
             return jsonify({"message": f"Error fetching hoodies_details: {str(e)}"}), 500
 
+    # Route: Get a hoodie with all its details in one request (?limit/&after paginate the details)
+    @hoodies_details_bp.route("/hoodies/<hoodie_id>/full", methods=["GET"])
+    @conditional(db, ("hoodies", "hoodies_details"))
+    def get_hoodie_full(hoodie_id):
+        try:
+            page = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        if page["sort"] is not None:
+            return jsonify({"message": "Details are returned in creation order"}), 400
+
+        try:
+            hoodie = HoodiesDetailsModel(db).get_full(hoodie_id, limit=page["limit"], after=page["after"])
+        except InvalidId:
+            hoodie = None
+        except Exception as e:
+            return jsonify({"message": f"Error fetching hoodie: {str(e)}"}), 500
+        if not hoodie:
+            return jsonify({"message": "Hoodie not found"}), 404
+        return jsonify(hoodie), 200
+
     # Route: Update a hoodies_details
     @hoodies_details_bp.route("/hoodies_details/<hoodie_detail_id>", methods=["PUT"])
     def update_hoodies_details(hoodie_detail_id):
         try:
-            hoodies_details_model = HoodiesDetailsModel(db)
-            hoodies_details = hoodies_details_model.get_item_by_id(hoodie_detail_id)
-            if not hoodies_details:
+            if not ObjectId.is_valid(hoodie_detail_id):
                 return jsonify({"message": "T-shirts details not found"}), 404
 
             updated_data = request.form.to_dict()
+            updated_data.pop("upload_id", None)
+            try:
+                image = uploaded_image(request)
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
 
             # Get and validate hoodie_id from the form data
             hoodie_id = updated_data.get("hoodie_id")
@@ -116,23 +153,31 @@ def create_hoodies_details_routes(db):
                     return jsonify({"message": "Invalid price format"}), 400
 
             # Update image if present
-            if "image" in request.files:
-                image = request.files["image"]
-                if not allowed_file(image.filename):
+            if image is not None:
+                if not allowed_file(image.filename) or not is_image(image):
                     return jsonify({"message": "Invalid image file type"}), 400
 
-                filename = secure_filename(image.filename)
-                image_path = os.path.join(UPLOAD_FOLDER, filename)
-                image.save(image_path)
-                base_url = request.host_url
-                updated_data["image_url"] = generate_image_url(filename, base_url)
-
-            # Update in database
-            success = hoodies_details_model.update_item(hoodie_detail_id, updated_data)
-            if success:
-                updated_hoodies_details = hoodies_details_model.get_item_by_id(hoodie_detail_id)
-                return jsonify(updated_hoodies_details), 200
-            return jsonify({"message": "Error updating hoodies_details"}), 500
+                image_path = store_upload(db, image)
+                updated_data["image_url"] = generate_media_url(image_path, request.host_url)
+                updated_data["image_variants"] = {}
+
+            if not updated_data:
+                return jsonify({"message": "Nothing to update"}), 400
+
+            # Update in database: one round trip, which also returns the image being replaced
+            result = HoodiesDetailsModel(db).update_item(hoodie_detail_id, updated_data)
+            hoodies_details, previous_image = result or (None, None)
+            if not hoodies_details:
+                if image is not None:
+                    release_upload(db, updated_data["image_url"])
+                if result:
+                    return jsonify({"message": "T-shirts details not found"}), 404
+                return jsonify({"message": "Error updating hoodies_details"}), 500
+            invalidate_collection(db, "hoodies_details", hoodie_detail_id)
+            if image is not None:
+                release_upload(db, previous_image)
+                schedule_variants(db, "hoodies_details", ObjectId(hoodie_detail_id), image_path, request.host_url)
+            return jsonify(hoodies_details), 200
         except Exception as e:
             return jsonify({"message": f"Error updating hoodies_details: {str(e)}"}), 500
 
@@ -140,15 +185,18 @@ def create_hoodies_details_routes(db):
     @hoodies_details_bp.route("/hoodies_details/<hoodie_detail_id>", methods=["DELETE"])
     def delete_hoodies_details(hoodie_detail_id):
         try:
-            hoodies_details_model = HoodiesDetailsModel(db)
-            hoodies_details = hoodies_details_model.get_item_by_id(hoodie_detail_id)
-            if not hoodies_details:
+            if not ObjectId.is_valid(hoodie_detail_id):
                 return jsonify({"message": "T-shirts details not found"}), 404
 
-            success = hoodies_details_model.delete_item(hoodie_detail_id)
-            if success:
-                return jsonify({"message": "T-shirts details deleted successfully"}), 200
-            return jsonify({"message": "Error deleting hoodies_details"}), 500
+            # One round trip, which also returns the image to release
+            deleted = HoodiesDetailsModel(db).delete_item(hoodie_detail_id)
+            if deleted is None:
+                return jsonify({"message": "T-shirts details not found"}), 404
+            if not deleted:
+                return jsonify({"message": "Error deleting hoodies_details"}), 500
+            invalidate_collection(db, "hoodies_details", hoodie_detail_id)
+            release_upload(db, deleted.get("image_url"))
+            return jsonify({"message": "T-shirts details deleted successfully"}), 200
         except Exception as e:
             return jsonify({"message": f"Error deleting hoodies_details: {str(e)}"}), 500
 
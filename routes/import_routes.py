@@ -0,0 +1,41 @@
+from flask import Blueprint, request, jsonify
+from config import Config
+from catalog_io import FORMATS, IMPORT_TARGETS, import_rows, read_rows
+
+
+def request_format():
+    """Import format from ?format= or the Content-Type (NDJSON by default)."""
+    fmt = request.args.get("format")
+    if not fmt:
+        fmt = "csv" if request.mimetype in ("text/csv", "application/csv") else "ndjson"
+    return fmt
+
+
+# Blueprint factory
+def create_import_routes(db):
+    import_bp = Blueprint('import', __name__)
+
+    # Route: Bulk import NDJSON or CSV rows (?collection=tshirts&format=csv)
+    @import_bp.route("/import", methods=["POST"])
+    def import_catalog():
+        collection = request.args.get("collection")
+        fmt = request_format()
+        if collection not in IMPORT_TARGETS:
+            return jsonify({"message": f"collection must be one of {', '.join(IMPORT_TARGETS)}"}), 400
+        if fmt not in FORMATS:
+            return jsonify({"message": f"format must be one of {', '.join(FORMATS)}"}), 400
+
+        try:
+            # The body is streamed, so it may exceed the upload limit
+            request.max_content_length = Config.IMPORT_MAX_SIZE
+            report = import_rows(db, collection, read_rows(request.stream, fmt), request.args.get("batch_size", type=int))
+            # A partial import still answers with its report: those rows were inserted
+            if "error" in report:
+                return jsonify(report), 500
+            return jsonify(report), 200 if report["complete"] else 400
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({"message": f"Invalid import body: {str(e)}"}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error importing {collection}: {str(e)}"}), 500
+
+    return import_bp
@@ -0,0 +1,65 @@
+import io
+import mimetypes
+import os
+from flask import Blueprint, current_app, jsonify, make_response, request, send_file, send_from_directory
+from werkzeug.security import safe_join
+from config import Config
+from cache import image_cache
+from renditions import send_image
+from resumable import SESSIONS_FOLDER
+from storage import STAGING_FOLDER, UPLOADS_FOLDER
+
+
+def offload_response(filename, max_age):
+    """Empty response telling nginx to send uploads/<filename> itself (X-Accel-Redirect).
+
+    nginx then handles validators and Range requests, and streams the file
+    without it passing through Python.
+    """
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response = current_app.response_class(mimetype=mimetype)
+    response.headers["X-Accel-Redirect"] = Config.MEDIA_ACCEL_PREFIX + filename
+    response.cache_control.max_age = max_age
+    return response
+
+
+# Blueprint factory
+def create_media_routes():
+    media_bp = Blueprint('media', __name__)
+
+    # Route: Serve an uploaded image (supports ?w=&q= resizing, ETag, Last-Modified and Range)
+    @media_bp.route("/uploads/<path:filename>", methods=["GET"])
+    def serve_upload(filename):
+        path = safe_join(UPLOADS_FOLDER, filename)
+        private = (STAGING_FOLDER + os.sep, SESSIONS_FOLDER + os.sep)
+        if path is None or path.startswith(private) or not os.path.isfile(path):
+            return jsonify({"message": "File not found"}), 404
+
+        # Content-addressed files never change; legacy files can be overwritten
+        immutable = filename.startswith("media/")
+        max_age = Config.MEDIA_MAX_AGE if immutable else Config.UPLOAD_MAX_AGE
+
+        if "w" in request.args or "q" in request.args:
+            response = make_response(send_image(UPLOADS_FOLDER, filename, max_age=max_age))
+            if response.status_code >= 400:
+                return response
+        elif Config.MEDIA_OFFLOAD == "x-accel":
+            response = offload_response(filename, max_age)
+        else:
+            # Small files are served from memory; the rest from disk, where
+            # MEDIA_OFFLOAD = "x-sendfile" makes Flask emit X-Sendfile (USE_X_SENDFILE)
+            cached = image_cache.get_or_load(path)
+            if cached is not None:
+                response = send_file(
+                    io.BytesIO(cached.data), mimetype=cached.mimetype, etag=cached.etag,
+                    last_modified=cached.mtime, max_age=max_age,
+                )
+            else:
+                response = send_from_directory(UPLOADS_FOLDER, filename, max_age=max_age)
+
+        response.cache_control.public = True
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
+    return media_bp
@@ -1,7 +1,15 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
-import os
 from bson import ObjectId
+from config import Config
+from utils import CATALOG_PROJECTION, build_filter, catalog_list, parse_page_args, set_fields
+from cache import conditional, invalidate_collection
+from storage import generate_media_url, is_image, release_upload, store_upload
+from thumbnails import schedule_variants
+from resumable import uploaded_image
+
+# Utility function to check allowed file types
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
 def create_product_routes(db, upload_folder):
     product_bp = Blueprint('products', __name__)
@@ -19,51 +27,61 @@ def create_product_routes(db, upload_folder):
             # Extract data
             name = request.form.get("name")
             price = request.form.get("price")
-            image = request.files.get("image")
+            try:
+                image = uploaded_image(request)  # file part, or a finished resumable upload
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
 
             # Validate required fields
             if not all([name, price, image]):
                 return jsonify({"message": "Missing required fields"}), 400
 
-            # Save image
-            if not os.path.exists(upload_folder):
-                os.makedirs(upload_folder)
-            filename = secure_filename(image.filename)
-            image_path = os.path.join(upload_folder, filename)
-            image.save(image_path)
+            if not allowed_file(image.filename) or not is_image(image):
+                return jsonify({"message": "Invalid image file type"}), 400
+
+            # Store the image once under its content hash
+            image_path = store_upload(db, image)
+            image_url = generate_media_url(image_path, request.host_url)
 
             # Create product data
             product_data = {
                 "name": name,
                 "price": float(price),
-                "image_url": image_path
+                "image_url": image_url
             }
 
             # Insert into MongoDB
             result = db.products.insert_one(product_data)
             product_data["_id"] = str(result.inserted_id)  # Include ID in the response
+            invalidate_collection(db, "products", product_data["_id"])
+            schedule_variants(db, "products", result.inserted_id, image_path, request.host_url)
             return jsonify(product_data), 201
         except Exception as e:
             return jsonify({"message": f"Error creating product: {str(e)}"}), 500
 
     # GET: Fetch all products
     @product_bp.route("/products", methods=["GET"])
+    @conditional(db, "products")
     def get_all_products():
         try:
-            products = db.products.find({}, {"name": 1, "price": 1, "image_url": 1})
-            products_list = [{**p, "_id": str(p["_id"])} for p in products]  # Serialize ObjectId
-            return jsonify(products_list), 200
+            page = parse_page_args(request.args)
+            query = build_filter(request.args)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        try:
+            return jsonify(catalog_list(db.products, page, query)), 200
         except Exception as e:
             return jsonify({"message": f"Error fetching products: {str(e)}"}), 500
 
     # GET: Fetch a product by ID
     @product_bp.route("/products/<id>", methods=["GET"])
+    @conditional(db, "products")
     def get_product_by_id(id):
         try:
-            product = db.products.find_one({"_id": ObjectId(id)}, {"name": 1, "price": 1, "image_url": 1})
+            product = db.products.find_one({"_id": ObjectId(id)}, CATALOG_PROJECTION)
             if not product:
                 return jsonify({"message": "Product not found"}), 404
-            product["_id"] = str(product["_id"])  # Serialize ObjectId
             return jsonify(product), 200
         except Exception as e:
             return jsonify({"message": f"Error fetching product: {str(e)}"}), 500
@@ -72,27 +90,38 @@ def create_product_routes(db, upload_folder):
     @product_bp.route("/products/<id>", methods=["PUT"])
     def update_product(id):
         try:
-            # Extract product to update
-            product = db.products.find_one({"_id": ObjectId(id)})
-            if not product:
-                return jsonify({"message": "Product not found"}), 404
+            item_id = ObjectId(id)
 
             # Extract updated data
             updated_data = request.form.to_dict()
+            updated_data.pop("upload_id", None)
+            try:
+                image = uploaded_image(request)
+            except ValueError as e:
+                return jsonify({"message": str(e)}), 400
             if "price" in updated_data:
                 updated_data["price"] = float(updated_data["price"])
-            if "image" in request.files:
-                image = request.files.get("image")
-                filename = secure_filename(image.filename)
-                image_path = os.path.join(upload_folder, filename)
-                image.save(image_path)
-                updated_data["image_url"] = image_path
-
-            # Update in MongoDB
-            db.products.update_one({"_id": ObjectId(id)}, {"$set": updated_data})
-            updated_product = db.products.find_one({"_id": ObjectId(id)}, {"name": 1, "price": 1, "image_url": 1})
-            updated_product["_id"] = str(updated_product["_id"])
-            return jsonify(updated_product), 200
+            if image is not None:
+                if not allowed_file(image.filename) or not is_image(image):
+                    return jsonify({"message": "Invalid image file type"}), 400
+                image_path = store_upload(db, image)
+                updated_data["image_url"] = generate_media_url(image_path, request.host_url)
+                updated_data["image_variants"] = {}
+
+            if not updated_data:
+                return jsonify({"message": "Nothing to update"}), 400
+
+            # One round trip, which also returns the image being replaced
+            product, previous_image = set_fields(db.products, item_id, updated_data)
+            if not product:
+                if image is not None:
+                    release_upload(db, updated_data["image_url"])
+                return jsonify({"message": "Product not found"}), 404
+            invalidate_collection(db, "products", str(item_id))
+            if image is not None:
+                release_upload(db, previous_image)
+                schedule_variants(db, "products", item_id, image_path, request.host_url)
+            return jsonify(product), 200
         except Exception as e:
             return jsonify({"message": f"Error updating product: {str(e)}"}), 500
 
@@ -100,9 +129,11 @@ def create_product_routes(db, upload_folder):
     @product_bp.route("/products/<id>", methods=["DELETE"])
     def delete_product(id):
         try:
-            result = db.products.delete_one({"_id": ObjectId(id)})
-            if result.deleted_count == 0:
+            product = db.products.find_one_and_delete({"_id": ObjectId(id)}, projection={"image_url": 1})
+            if not product:
                 return jsonify({"message": "Product not found"}), 404
+            invalidate_collection(db, "products", str(ObjectId(id)))
+            release_upload(db, product.get("image_url"))
             return jsonify({"message": "Product deleted successfully"}), 200
         except Exception as e:
             return jsonify({"message": f"Error deleting product: {str(e)}"}), 500
@@ -0,0 +1,28 @@
+from flask import Blueprint, jsonify
+from cache import catalog_cache, encoded_cache, image_cache
+from renditions import rendition_cache
+from roundtrips import round_trips
+from auth import admin_cache, token_cache
+
+# Blueprint factory
+def create_stats_routes():
+    stats_bp = Blueprint('stats', __name__)
+
+    # Route: Cache counters (catalog hits/misses/evictions, compressed bodies, hot images, rendition disk usage, auth)
+    @stats_bp.route("/stats/cache", methods=["GET"])
+    def get_cache_stats():
+        return jsonify({
+            "catalog": catalog_cache.stats(),
+            "compressed": encoded_cache.stats(),
+            "images": image_cache.stats(),
+            "renditions": rendition_cache.stats(),
+            "admin_tokens": token_cache.stats(),
+            "admins": admin_cache.stats(),
+        }), 200
+
+    # Route: MongoDB commands sent since startup, by command name (each one is a round trip)
+    @stats_bp.route("/stats/db", methods=["GET"])
+    def get_db_stats():
+        return jsonify(round_trips.stats()), 200
+
+    return stats_bp
@@ -0,0 +1,79 @@
+from flask import Blueprint, request, jsonify, url_for
+from resumable import (
+    create_session, delete_session, get_session, is_complete, parse_metadata, received_offset, write_chunk,
+)
+
+
+def session_response(upload_id, meta, status=200):
+    """Session state as JSON plus the tus-style Upload-Offset/Upload-Length headers."""
+    response = jsonify({
+        "upload_id": upload_id,
+        "length": meta["length"],
+        "offset": received_offset(meta),
+        "ranges": meta["ranges"],
+        "complete": is_complete(meta),
+    })
+    response.status_code = status
+    response.headers["Upload-Offset"] = str(received_offset(meta))
+    response.headers["Upload-Length"] = str(meta["length"])
+    response.cache_control.no_store = True
+    return response
+
+
+# Blueprint factory
+def create_upload_routes():
+    uploads_bp = Blueprint('uploads', __name__)
+
+    # Route: Start a resumable upload (Upload-Length header, filename in Upload-Metadata or the form)
+    @uploads_bp.route("/uploads", methods=["POST"])
+    def create_upload():
+        try:
+            length = int(request.headers.get("Upload-Length") or request.form.get("length") or 0)
+            filename = parse_metadata(request.headers.get("Upload-Metadata")).get("filename") or request.form.get("filename")
+            if not filename:
+                return jsonify({"message": "Missing filename"}), 400
+
+            upload_id = create_session(length, filename)
+            response = session_response(upload_id, get_session(upload_id), 201)
+            response.headers["Location"] = url_for("uploads.get_upload", upload_id=upload_id)
+            return response
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error creating upload: {str(e)}"}), 500
+
+    # Route: Upload progress (HEAD returns just the headers)
+    @uploads_bp.route("/uploads/<upload_id>", methods=["GET"])
+    def get_upload(upload_id):
+        try:
+            return session_response(upload_id, get_session(upload_id))
+        except KeyError:
+            return jsonify({"message": "Upload not found"}), 404
+
+    # Route: Write one chunk of the body at Upload-Offset; chunks may be sent in parallel
+    @uploads_bp.route("/uploads/<upload_id>", methods=["PATCH"])
+    def patch_upload(upload_id):
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            return jsonify({"message": "Missing or invalid Upload-Offset"}), 400
+        try:
+            meta = write_chunk(upload_id, offset, request.stream)
+            return session_response(upload_id, meta)
+        except KeyError:
+            return jsonify({"message": "Upload not found"}), 404
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except Exception as e:
+            return jsonify({"message": f"Error writing upload: {str(e)}"}), 500
+
+    # Route: Abandon an upload
+    @uploads_bp.route("/uploads/<upload_id>", methods=["DELETE"])
+    def delete_upload(upload_id):
+        try:
+            delete_session(upload_id)
+            return jsonify({"message": "Upload deleted successfully"}), 200
+        except KeyError:
+            return jsonify({"message": "Upload not found"}), 404
+
+    return uploads_bp
@@ -30,7 +30,7 @@ def setup_login_routes(db):
 
         # Check credentials
         user = login_model.get_user_by_email(email)
-        if not user or not login_model.check_password(user["password"], password):
+        if not user or not login_model.check_password(user, password):
             return jsonify({"error": "Invalid email or password"}), 401
 
         # Generate token
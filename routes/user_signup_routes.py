@@ -36,12 +36,9 @@ def create_auth_routes(db):
         if password != confirm_password:
             return jsonify({"error": "Passwords do not match"}), 400
 
-        # Check for duplicate email and mobile
-        if user_model.is_email_registered(email):
+        # Create new user; the unique email index rejects duplicates in the same round trip
+        if not user_model.create_user(name, email, password):
             return jsonify({"error": "Email already registered"}), 400
-
-        # Create new user
-        user_model.create_user(name, email, password)
         return jsonify({"message": "User registered successfully"}), 201
 
     return auth_bp
@@ -0,0 +1,251 @@
+import datetime
+import hashlib
+import io
+import mimetypes
+import os
+import tempfile
+from collections import Counter
+from urllib.parse import urlparse
+from flask import Request
+from pymongo import ReturnDocument, UpdateOne
+from config import Config
+from cache import image_cache
+
+# Everything served under /uploads: the legacy per-category folders and media/
+UPLOADS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+
+# Content-addressed image store: uploads/media/ab/cd/<sha256>.<ext>
+MEDIA_FOLDER = os.path.join(UPLOADS_FOLDER, 'media')
+STAGING_FOLDER = os.path.join(MEDIA_FOLDER, 'tmp')
+
+os.makedirs(STAGING_FOLDER, exist_ok=True)
+
+
+def blob_path(digest, ext):
+    """Sharded path of a blob relative to MEDIA_FOLDER."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def generate_media_url(relpath, base_url):
+    return f"{base_url}uploads/media/{relpath}"
+
+
+def upload_relpath(image_url):
+    """Path below UPLOADS_FOLDER that an image URL points to, or None for foreign URLs."""
+    if not image_url:
+        return None
+    path = urlparse(image_url).path
+    _, found, relpath = path.partition("/uploads/")
+    return relpath or None if found else None
+
+
+def media_digest(image_url):
+    """Return the SHA-256 a media URL points to, or None for legacy per-category URLs."""
+    if not image_url or "/uploads/media/" not in image_url:
+        return None
+    return image_url.rsplit("/", 1)[-1].split(".", 1)[0]
+
+
+# Leading bytes of the image formats accepted for upload (ALLOWED_EXTENSIONS),
+# with the extension a blob of that format is stored under. Many existing
+# .jpg/.jpeg files are really WebP or AVIF/HEIC, so those are accepted too:
+# WebP is "RIFF" <size> "WEBP", AVIF/HEIC an ISO-BMFF "ftyp" box
+# (<box size> "ftyp" <brand>) at offset 0.
+IMAGE_SIGNATURES = {b"\xff\xd8\xff": "jpg", b"\x89PNG\r\n\x1a\n": "png", b"GIF87a": "gif", b"GIF89a": "gif"}
+FTYP_BRANDS = {b"avif": "avif", b"avis": "avif", b"heic": "heic", b"heix": "heic", b"mif1": "heif"}
+SIGNATURE_LENGTH = 12
+
+# Blobs are served with the type their extension maps to; not every mime.types knows these
+for _type, _ext in (("image/webp", ".webp"), ("image/avif", ".avif"), ("image/heic", ".heic"), ("image/heif", ".heif")):
+    mimetypes.add_type(_type, _ext)
+
+
+def image_extension(head):
+    """Extension of the image format `head` starts with, or None if it is not an accepted image."""
+    for signature, ext in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(head[8:12])
+    return None
+
+
+def is_image_header(head):
+    return image_extension(head) is not None
+
+
+class StagedUpload:
+    """Writable stream that multipart parsing spools an uploaded file into.
+
+    Bytes go straight to a staging file next to their final location through a
+    fixed-size buffer and are hashed on the way, so an upload costs constant
+    memory however large it is. The first bytes are checked against
+    IMAGE_SIGNATURES; anything else is rejected at once and the rest of the
+    part is discarded without being written.
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(dir=STAGING_FOLDER)
+        self._file = os.fdopen(fd, "w+b", buffering=Config.UPLOAD_CHUNK_SIZE)
+        self._head = b""
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.rejected = False
+        self.claimed = False
+
+    def write(self, data):
+        if self.rejected:
+            return len(data)
+        if len(self._head) < SIGNATURE_LENGTH:
+            self._head += data[:SIGNATURE_LENGTH - len(self._head)]
+            if len(self._head) >= SIGNATURE_LENGTH and not is_image_header(self._head):
+                self._reject()
+                return len(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def _reject(self):
+        self.rejected = True
+        self._discard()
+        self._file = io.BytesIO()
+
+    def is_image(self):
+        # Parts shorter than the longest signature are checked once complete
+        return not self.rejected and is_image_header(self._head)
+
+    def claim(self):
+        """Hand the staged file over to the caller as `(path, sha256 hex digest, size)`."""
+        self._file.close()
+        self.claimed = True
+        return self.path, self.sha256.hexdigest(), self.size
+
+    def stored(self):
+        """Called by store_upload once the claimed file is in place."""
+
+    def unclaim(self):
+        """Called by store_upload when storing the claimed file failed."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _discard(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def close(self):
+        if not self.claimed:
+            self._discard()
+
+    def __getattr__(self, name):
+        # seek, read, tell, ... of the underlying file
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Request class that spools multipart files into StagedUpload streams."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return StagedUpload()
+
+
+def is_image(file):
+    """True when an uploaded file starts with the signature of an accepted image format."""
+    if isinstance(file.stream, StagedUpload):
+        return file.stream.is_image()
+    head = file.stream.read(SIGNATURE_LENGTH)
+    file.stream.seek(0)
+    return is_image_header(head)
+
+
+def _stage_copy(stream):
+    """Copy a stream that was not spooled by UploadRequest into a staging file."""
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, staged = tempfile.mkstemp(dir=STAGING_FOLDER)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(Config.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(staged)
+        raise
+    return staged, sha256.hexdigest(), size
+
+
+def store_upload(db, file):
+    """Store an uploaded image once per distinct content and return its relative path.
+
+    The file arrives already staged and hashed (see UploadRequest). If a blob
+    with the same hash already exists the staged copy is discarded, so
+    identical images cost no extra disk; either way the blob's reference count
+    in the `media` collection is incremented.
+    """
+    upload = file.stream if isinstance(file.stream, StagedUpload) else None
+    if upload is not None:
+        staged, digest, size = upload.claim()
+    else:
+        staged, digest, size = _stage_copy(file.stream)
+
+    try:
+        # Named after the content, not the client's filename: a .jpg that is
+        # really WebP must be served as image/webp
+        with open(staged, "rb") as f:
+            ext = image_extension(f.read(SIGNATURE_LENGTH)) or file.filename.rsplit('.', 1)[1].lower()
+        media = db.media.find_one_and_update(
+            {"_id": digest},
+            {
+                "$inc": {"refs": 1},
+                # Lets the upload sweeper tell a blob that is being reused from an orphan
+                "$set": {"updated_at": datetime.datetime.utcnow()},
+                "$setOnInsert": {"path": blob_path(digest, ext), "size": size, "created_at": datetime.datetime.utcnow()},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        final = os.path.join(MEDIA_FOLDER, media["path"])
+        if os.path.exists(final):
+            os.unlink(staged)
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(staged, final)
+            image_cache.invalidate(final)
+        if upload is not None:
+            upload.stored()
+        return media["path"]
+    except Exception:
+        if upload is not None:
+            upload.unclaim()
+        elif os.path.exists(staged):
+            os.unlink(staged)
+        raise
+
+
+def release_upload(db, image_url):
+    """Drop one reference to the blob behind `image_url`.
+
+    Blobs are not unlinked here: a concurrent upload of the same content may be
+    about to reuse it. Files left with no references are removed by the
+    upload sweeper.
+    """
+    digest = media_digest(image_url)
+    if digest:
+        db.media.update_one({"_id": digest, "refs": {"$gt": 0}}, {"$inc": {"refs": -1}})
+
+
+def release_uploads(db, image_urls):
+    """release_upload for many URLs at once: one bulk_write however many documents went."""
+    counts = Counter(filter(None, map(media_digest, image_urls)))
+    if counts:
+        db.media.bulk_write(
+            [UpdateOne({"_id": digest, "refs": {"$gt": 0}}, {"$inc": {"refs": -n}}) for digest, n in counts.items()],
+            ordered=False,
+        )
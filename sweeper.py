@@ -0,0 +1,246 @@
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pymongo.errors import DuplicateKeyError
+from config import Config
+from cache import image_cache
+from resumable import SESSIONS_FOLDER
+from storage import STAGING_FOLDER, UPLOADS_FOLDER, upload_relpath
+from utils import CATALOG_COLLECTIONS
+
+# Every collection whose documents reference uploaded images
+IMAGE_COLLECTIONS = CATALOG_COLLECTIONS + ("tshirts_details", "hoodies_details", "combos_details")
+
+# Unreferenced files are moved here first and deleted after SWEEP_QUARANTINE_TTL.
+# It lives outside uploads/ so quarantined files are no longer served.
+QUARANTINE_FOLDER = os.path.join(os.path.dirname(UPLOADS_FOLDER), 'quarantine')
+QUARANTINED_FILES = os.path.join(QUARANTINE_FOLDER, 'files')
+CHECKPOINT_PATH = os.path.join(QUARANTINE_FOLDER, 'checkpoint.json')
+
+# Work areas below uploads/ that never hold referenced images
+EXCLUDED_DIRS = {os.path.relpath(d, UPLOADS_FOLDER) for d in (STAGING_FOLDER, SESSIONS_FOLDER)}
+
+# Uploads are on local disk, so the lease is per host: one sweeping process per machine
+LEASE_ID = f"upload-sweeper:{socket.gethostname()}"
+
+
+def reference_index(db):
+    """Set of paths below uploads/ referenced by any image_url or image_variants URL."""
+    referenced = set()
+    for name in IMAGE_COLLECTIONS:
+        cursor = db[name].find({}, {"image_url": 1, "image_variants": 1}).batch_size(Config.STREAM_BATCH_SIZE)
+        for doc in cursor:
+            urls = [doc.get("image_url")]
+            for formats in (doc.get("image_variants") or {}).values():
+                urls.extend(formats.values())
+            referenced.update(filter(None, map(upload_relpath, urls)))
+    return referenced
+
+
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT_PATH) as f:
+            checkpoint = json.load(f)
+        return {"dirs": checkpoint["dirs"], "refs": set(checkpoint["refs"]), "pending": set(checkpoint["pending"])}
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def save_checkpoint(dirs, refs, pending):
+    os.makedirs(QUARANTINE_FOLDER, exist_ok=True)
+    partial = CHECKPOINT_PATH + ".part"
+    with open(partial, "w") as f:
+        json.dump({"dirs": dirs, "refs": sorted(refs), "pending": sorted(pending)}, f)
+    os.replace(partial, CHECKPOINT_PATH)
+
+
+def scan_tree(known_dirs):
+    """Walk uploads/, listing only directories whose mtime changed since the checkpoint.
+
+    A directory's mtime changes whenever an entry is added, removed or renamed
+    in it, so an unchanged directory still has the files and subdirectories
+    recorded last time and does not need to be listed again. Returns
+    `(dirs, new_files, listed)` where `new_files` are the files of the listed
+    directories.
+    """
+    dirs, new_files, listed = {}, [], 0
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        if rel in EXCLUDED_DIRS:
+            continue
+        path = os.path.join(UPLOADS_FOLDER, rel)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+
+        known = known_dirs.get(rel)
+        if known and known["mtime"] == mtime:
+            subdirs = known["subdirs"]
+        else:
+            listed += 1
+            subdirs = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    child = f"{rel}/{entry.name}" if rel else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(child)
+                    elif entry.is_file(follow_symlinks=False):
+                        new_files.append(child)
+        dirs[rel] = {"mtime": mtime, "subdirs": subdirs}
+        stack.extend(subdirs)
+    return dirs, new_files, listed
+
+
+def _media_digest(relpath):
+    """SHA-256 of an original media blob (variants and legacy files have none)."""
+    if not relpath.startswith("media/"):
+        return None
+    stem = os.path.basename(relpath).split(".", 1)[0]
+    return None if "_" in stem else stem
+
+
+def quarantine(db, relpath, cutoff):
+    """Move one unreferenced file into quarantine; return False if it turned out to be in use.
+
+    For media blobs the `media` document is removed only if the blob was not
+    stored again since `cutoff` (store_upload bumps updated_at). If it was, an
+    upload is reusing it right now and the file is put back.
+    """
+    source = os.path.join(UPLOADS_FOLDER, relpath)
+    target = os.path.join(QUARANTINED_FILES, relpath)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(source, target)
+    image_cache.invalidate(source)
+
+    digest = _media_digest(relpath)
+    if digest:
+        removed = db.media.delete_one({"_id": digest, "updated_at": {"$not": {"$gte": cutoff}}}).deleted_count
+        if not removed and db.media.count_documents({"_id": digest}, limit=1):
+            if not os.path.exists(source):
+                os.replace(target, source)
+            else:
+                os.unlink(target)
+            return False
+    os.utime(target)  # the quarantine period starts now
+    return True
+
+
+def purge_quarantine(dry_run=False):
+    """Delete quarantined files older than SWEEP_QUARANTINE_TTL; return (count, bytes)."""
+    count = size = 0
+    cutoff = time.time() - Config.SWEEP_QUARANTINE_TTL
+    for root, _, files in os.walk(QUARANTINED_FILES):
+        for name in files:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if stat.st_mtime < cutoff:
+                count += 1
+                size += stat.st_size
+                if not dry_run:
+                    os.unlink(path)
+    return count, size
+
+
+def sweep(db, dry_run=False, full=False):
+    """Quarantine unreferenced uploads, purge old quarantine, and return a report.
+
+    Candidates are the files of directories that changed since the last
+    checkpoint, files whose reference disappeared since then, files that were
+    still within SWEEP_GRACE last time, and media blobs left with no
+    references. Work is therefore proportional to what changed, not to the
+    size of the upload tree. `full` ignores the checkpoint. `dry_run` only
+    reports what would be done.
+    """
+    started = time.time()
+    checkpoint = None if full else load_checkpoint()
+    if checkpoint is None:
+        checkpoint = {"dirs": {}, "refs": set(), "pending": set()}
+
+    refs = reference_index(db)
+    dirs, new_files, listed = scan_tree(checkpoint["dirs"])
+    candidates = set(new_files) | (checkpoint["refs"] - refs) | checkpoint["pending"]
+    for media in db.media.find({"refs": {"$lte": 0}}, {"path": 1}):
+        candidates.add(f"media/{media['path']}")
+    candidates -= refs
+
+    grace_cutoff = started - Config.SWEEP_GRACE
+    mongo_cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=Config.SWEEP_GRACE)
+    orphans, pending, reclaimed = [], set(), 0
+    for relpath in sorted(candidates):
+        if os.path.dirname(relpath) in EXCLUDED_DIRS:
+            continue
+        try:
+            stat = os.stat(os.path.join(UPLOADS_FOLDER, relpath))
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime > grace_cutoff:
+            pending.add(relpath)  # too recent: may belong to a request still in flight
+            continue
+        if dry_run or quarantine(db, relpath, mongo_cutoff):
+            orphans.append(relpath)
+            reclaimed += stat.st_size
+
+    purged, purged_bytes = purge_quarantine(dry_run)
+    if not dry_run:
+        if orphans:
+            # Quarantining changed some directories. Re-list them so the
+            # checkpoint has their new mtimes, keeping files that arrived
+            # meanwhile as candidates for the next sweep.
+            dirs, relisted, _ = scan_tree(dirs)
+            pending |= set(relisted) - refs
+        save_checkpoint(dirs, refs, pending)
+
+    return {
+        "dry_run": dry_run,
+        "referenced": len(refs),
+        "directories": len(dirs),
+        "listed_directories": listed,
+        "candidates": len(candidates),
+        "quarantined": orphans,
+        "quarantined_bytes": reclaimed,
+        "pending": len(pending),
+        "purged": purged,
+        "purged_bytes": purged_bytes,
+        "seconds": round(time.time() - started, 3),
+    }
+
+
+def acquire_lease(db, owner):
+    """Take or renew the sweeper lease so only one process sweeps at a time."""
+    now = datetime.datetime.utcnow()
+    try:
+        db.locks.find_one_and_update(
+            {"_id": LEASE_ID, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + datetime.timedelta(seconds=Config.SWEEP_LEASE_TTL)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False  # held by another process
+
+
+def start_sweeper(db):
+    """Run `sweep` every SWEEP_INTERVAL seconds in a daemon thread (disabled when None)."""
+    if not Config.SWEEP_INTERVAL:
+        return None
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def run():
+        while True:
+            time.sleep(Config.SWEEP_INTERVAL)
+            try:
+                if acquire_lease(db, owner):
+                    report = sweep(db)
+                    print(f"Upload sweep: {len(report['quarantined'])} quarantined, {report['purged']} purged")
+            except Exception as e:
+                print(f"Error sweeping uploads: {e}")
+
+    thread = threading.Thread(target=run, name="upload-sweeper", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,96 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+from cache import invalidate_collection
+from storage import MEDIA_FOLDER, generate_media_url
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow no variants are generated
+    Image = None
+
+# Formats written for every width, as (key in image_variants, Pillow format, extension)
+VARIANT_FORMATS = (("webp", "WEBP", "webp"), ("jpeg", "JPEG", "jpg"))
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(Config.THUMBNAIL_QUEUE_SIZE)
+
+
+def render_variants(relpath, widths, quality):
+    """Write the resized variants of one media blob and return their relative paths.
+
+    Runs in a worker process. Widths at or above the original width are
+    skipped rather than upscaled, and variants that already exist (from another
+    product sharing the same blob) are reused.
+    """
+    source = os.path.join(MEDIA_FOLDER, relpath)
+    stem = relpath.rsplit(".", 1)[0]
+    variants = {}
+    with Image.open(source) as image:
+        image.load()
+        for width in widths:
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = None
+            for key, fmt, ext in VARIANT_FORMATS:
+                target = f"{stem}_{width}.{ext}"
+                path = os.path.join(MEDIA_FOLDER, target)
+                if not os.path.exists(path):
+                    if resized is None:
+                        resized = image.convert("RGB").resize((width, height), Image.LANCZOS)
+                    partial = f"{path}.{os.getpid()}.part"
+                    resized.save(partial, fmt, quality=quality)
+                    os.replace(partial, path)
+                variants.setdefault(str(width), {})[key] = target
+    return variants
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=Config.THUMBNAIL_WORKERS)
+        return _executor
+
+
+def schedule_variants(db, collection, doc_id, relpath, base_url):
+    """Queue variant generation for a freshly stored image and return immediately.
+
+    When the variants are ready they are recorded as `image_variants` on the
+    document, provided it still points at the same image. If THUMBNAIL_QUEUE_SIZE
+    jobs are already pending the request is dropped; the product keeps serving
+    its original image.
+    """
+    if Image is None:
+        return False
+    if not _slots.acquire(blocking=False):
+        print(f"Thumbnail queue full, skipping variants for {collection}/{doc_id}")
+        return False
+
+    image_url = generate_media_url(relpath, base_url)
+
+    def record(future):
+        _slots.release()
+        try:
+            variants = {
+                width: {key: generate_media_url(path, base_url) for key, path in formats.items()}
+                for width, formats in future.result().items()
+            }
+            result = db[collection].update_one(
+                {"_id": doc_id, "image_url": image_url}, {"$set": {"image_variants": variants}}
+            )
+            if result.modified_count:
+                invalidate_collection(db, collection, str(doc_id))
+        except Exception as e:
+            print(f"Error generating variants for {collection}/{doc_id}: {e}")
+
+    try:
+        future = _get_executor().submit(render_variants, relpath, Config.THUMBNAIL_WIDTHS, Config.THUMBNAIL_QUALITY)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(record)
+    return True
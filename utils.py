@@ -1,9 +1,362 @@
+import base64
+import datetime
+import decimal
+import gzip
 import json
-from bson import ObjectId
-
-class JSONEncoder(json.JSONEncoder):
-    """Custom JSON encoder to handle ObjectId."""
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return super(JSONEncoder, self).default(obj)
+import re
+from bson import Decimal128, ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.collation import Collation, CollationStrength
+from flask import Response, current_app, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from config import Config
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+
+def json_default(obj):
+    """Encode the BSON types that come straight out of pymongo documents."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes ObjectId, datetime and Decimal128 natively.
+
+    Uses orjson when it is installed, which also lets responses be built from
+    bytes without an intermediate str.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault("default", json_default)
+            return json.dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+# Keyset sort orders supported by the list endpoints. Every order ends on _id so
+# that the key is unique and a page boundary can be resumed exactly.
+SORT_ORDERS = {
+    None: [("_id", 1)],
+    "price": [("price", 1), ("_id", 1)],
+    "-price": [("price", -1), ("_id", -1)],
+    "name": [("name", 1), ("_id", 1)],
+}
+
+
+# Type each sort field must have in a cursor, so a token can't smuggle an operator into the query
+CURSOR_FIELD_TYPES = {"price": (int, float), "name": str}
+
+
+def encode_cursor(doc, sort=None):
+    """Build the opaque `after` token pointing just past `doc`."""
+    key = {"s": sort, "id": str(doc["_id"])}
+    for field, _ in SORT_ORDERS[sort][:-1]:
+        key[field] = doc[field]
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, sort=None):
+    """Decode an `after` token produced by `encode_cursor` for the same sort."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(key, dict):
+            raise ValueError("not an object")
+        if key.get("s") != sort:
+            raise ValueError("Cursor does not match the requested sort")
+        for field, _ in SORT_ORDERS[sort][:-1]:
+            value = key.get(field)
+            if not isinstance(value, CURSOR_FIELD_TYPES[field]) or isinstance(value, bool):
+                raise ValueError(f"{field} missing or of the wrong type")
+        if not isinstance(key.get("id"), str):
+            raise ValueError("id missing or of the wrong type")
+        key["id"] = ObjectId(key["id"])
+        return key
+    except (TypeError, KeyError, InvalidId, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def parse_page_args(args):
+    """Read `limit`, `after` and `sort` from the query string.
+
+    `limit` is None when the client did not ask for pagination, which keeps the
+    legacy "whole collection as one array" response for existing clients.
+    """
+    sort = args.get("sort") or None
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Unsupported sort: {sort}")
+
+    limit = args.get("limit")
+    after = args.get("after")
+    if limit is None and after is None:
+        return {"limit": None, "after": None, "sort": sort}
+
+    try:
+        limit = int(limit) if limit is not None else Config.DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError("Invalid limit")
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    limit = min(limit, Config.MAX_PAGE_SIZE)
+
+    return {"limit": limit, "after": decode_cursor(after, sort) if after else None, "sort": sort}
+
+
+def build_filter(args):
+    """Translate the list filters in the query string into a Mongo query.
+
+    Supported: `min_price`, `max_price` and `name_prefix`. Every shape is backed
+    by the (price, _id) and (name, _id) indexes the catalog models declare.
+    """
+    query = {}
+    price = {}
+    for arg, op in (("min_price", "$gte"), ("max_price", "$lte")):
+        value = args.get(arg)
+        if value:
+            try:
+                price[op] = float(value.replace(",", ""))
+            except ValueError:
+                raise ValueError(f"Invalid {arg}")
+    if price:
+        query["price"] = price
+
+    prefix = args.get("name_prefix")
+    if prefix:
+        # An anchored, case-sensitive regex becomes a bounded index range scan
+        query["name"] = {"$regex": "^" + re.escape(prefix)}
+    return query
+
+
+def list_cache_key(name, page, query):
+    """Cache key for a list response, or None when it should not be cached.
+
+    The key is built from the parsed page and filter, so arguments the list
+    ignores don't create entries. An unpaginated list is the whole matching
+    collection; only the unfiltered ones (one per sort order) are cached, so
+    every other entry holds at most MAX_PAGE_SIZE documents and the cache's
+    entry bound also bounds its memory.
+    """
+    if page["limit"] is None and query:
+        return None
+    after = tuple(sorted((k, str(v)) for k, v in page["after"].items())) if page["after"] else None
+    return (name, "list", page["limit"], page["sort"], after, json.dumps(query, sort_keys=True))
+
+
+def keyset_query(query, after, sort=None):
+    """Restrict `query` to documents strictly after the cursor position."""
+    if not after:
+        return query
+
+    order = SORT_ORDERS[sort]
+    id_op = "$gt" if order[-1][1] == 1 else "$lt"
+    if len(order) == 1:
+        bound = {"_id": {id_op: after["id"]}}
+    else:
+        field, direction = order[0]
+        op = "$gt" if direction == 1 else "$lt"
+        bound = {"$or": [
+            {field: {op: after[field]}},
+            {field: after[field], "_id": {id_op: after["id"]}},
+        ]}
+    return {"$and": [query, bound]} if query else bound
+
+
+def paginate(collection, query, projection, limit=None, after=None, sort=None):
+    """Run a keyset-paginated find and return `(docs, next_cursor)`.
+
+    One extra document is fetched to learn whether another page exists, so each
+    page costs O(limit) no matter how deep into the collection it is.
+    """
+    cursor = collection.find(keyset_query(query, after, sort), projection).sort(SORT_ORDERS[sort])
+    if limit is None:
+        return list(cursor), None
+
+    docs = list(cursor.limit(limit + 1))
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1], sort)
+
+
+# Top-level catalog collections that share the {_id, name, price, image_url} shape;
+# image_variants is present once resized variants have been generated
+CATALOG_COLLECTIONS = ("tshirts", "hoodies", "combos", "products")
+CATALOG_PROJECTION = {"name": 1, "price": 1, "image_url": 1, "image_variants": 1}
+
+# Account emails are stored lowercased (see normalize_email) and compared
+# case-insensitively, so accounts created before they were normalized still
+# match. Queries must pass the same collation as the unique email indexes to be
+# answered by them. The index cannot be built while two accounts differ only in
+# the case of their email; `flask normalize-emails` resolves that.
+EMAIL_COLLATION = Collation(locale="en", strength=CollationStrength.SECONDARY)
+EMAIL_INDEX = "email_unique_ci"
+
+# (collection, index) pairs seen to exist; a missing index is looked up again
+_existing_indexes = set()
+
+
+def normalize_email(email):
+    """The form account emails are stored and looked up in."""
+    return email.strip().lower()
+
+
+def index_exists(collection, name):
+    """Whether `collection` has the index `name`.
+
+    Only a positive answer is remembered, so an index built later (by
+    `flask normalize-emails` or `flask ensure-indexes`) is picked up without
+    a restart.
+    """
+    key = (collection.full_name, name)
+    if key not in _existing_indexes:
+        if name not in collection.index_information():
+            return False
+        _existing_indexes.add(key)
+    return True
+
+
+def find_by_email(collection, email):
+    """Find an account by email, in any case."""
+    return collection.find_one({"email": normalize_email(email)}, collation=EMAIL_COLLATION)
+
+
+def insert_account(collection, doc):
+    """Insert an account with a normalized email; return False if the email is taken.
+
+    The unique email index rejects duplicates in the same round trip. While
+    it is missing, the email is checked first instead, which is racy, and
+    every signup logs that the index is missing.
+    """
+    doc = dict(doc, email=normalize_email(doc["email"]))
+    if not index_exists(collection, EMAIL_INDEX):
+        print(f"Unique email index missing on {collection.name}; run `flask normalize-emails`")
+        if find_by_email(collection, doc["email"]):
+            return False
+    try:
+        collection.insert_one(doc)
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def set_fields(collection, item_id, changes, projection=CATALOG_PROJECTION):
+    """`$set` `changes` on one document in a single find_one_and_update.
+
+    Returns `(document, previous_image_url)`, or `(None, None)` when there is
+    no such document. When `changes` replaces the image, the document is
+    fetched as it was before the update (so the old image can be released)
+    and the changes are applied to it locally; otherwise it is returned as
+    updated.
+    """
+    replacing = "image_url" in changes
+    doc = collection.find_one_and_update(
+        {"_id": ObjectId(item_id)},
+        {"$set": changes},
+        projection=projection,
+        return_document=ReturnDocument.BEFORE if replacing else ReturnDocument.AFTER,
+    )
+    if doc is None:
+        return None, None
+    previous = doc.get("image_url")
+    if replacing:
+        doc.update((field, value) for field, value in changes.items() if field in projection)
+    return doc, previous
+
+
+def catalog_list(collection, page, query=None):
+    """Load one list page of a catalog collection in its response shape.
+
+    Without a limit this is the legacy plain array, otherwise `{items, next}`.
+    """
+    docs, next_cursor = paginate(collection, query or {}, CATALOG_PROJECTION, **page)
+    if page["limit"] is None:
+        return docs
+    return {"items": docs, "next": next_cursor}
+
+
+def wants_ndjson():
+    """True when the client prefers newline-delimited JSON over a JSON array."""
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+
+def wants_stream():
+    """True when a list endpoint should stream instead of building the whole body."""
+    return request.args.get("stream", "").lower() in ("1", "true") or wants_ndjson()
+
+
+def stream_json(items, ndjson=False):
+    """Serialize `items` lazily as a JSON array (or NDJSON), in ~STREAM_CHUNK_SIZE chunks."""
+    dumps = current_app.json.dumps
+    buffer = [] if ndjson else ["["]
+    size = len(buffer)
+    separator = "\n" if ndjson else ","
+    first = True
+    for item in items:
+        chunk = dumps(item)
+        if ndjson:
+            chunk += separator
+        elif not first:
+            chunk = separator + chunk
+        first = False
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= Config.STREAM_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if not ndjson:
+        buffer.append("]")
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_response(items):
+    """Wrap an item iterator (usually a pymongo cursor) in a streamed JSON response."""
+    ndjson = wants_ndjson()
+    mimetype = "application/x-ndjson" if ndjson else "application/json"
+    return Response(stream_with_context(stream_json(items, ndjson)), mimetype=mimetype)
+
+
+def negotiate_encoding():
+    """Pick the response Content-Encoding from Accept-Encoding ("br", "gzip" or None)."""
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = request.accept_encodings.best_match(offered)
+    return best if best and request.accept_encodings[best] > 0 else None
+
+
+def compress_body(body, encoding):
+    """Compress `body` bytes with the configured level for `encoding`."""
+    if encoding == "br":
+        return brotli.compress(body, quality=Config.COMPRESS_BR_QUALITY)
+    return gzip.compress(body, compresslevel=Config.COMPRESS_LEVEL)